@@ -0,0 +1,472 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from landmark_cache import cache_key, save_motion
+from landmark_store import LandmarkBuffer
+from pose_pipeline import (
+    LITE_COMPLEXITY,
+    WARMUP_FRAMES,
+    FramePipeline,
+    motion_result,
+    refine_landmarks,
+)
+from rep_clips import seek_index
+from stage_timer import StageTimer
+from upload_store import hold, release
+
+# Background analysis jobs ------------------
+# Uploads are analyzed by a process-wide scheduler instead of the Streamlit
+# request. It owns INFERENCE_WORKERS threads, each running one pose pipeline
+# at a time, and every job is split into slices of SLICE_FRAMES frames.
+# A slice starts decoding WARMUP_FRAMES early so MediaPipe's tracking has
+# settled by the first frame it keeps.
+#
+# A free worker takes the next slice of the job with the fewest slices in
+# flight, and the one served longest ago on a tie. So concurrent uploads
+# share the workers evenly (a lone upload gets all of them), and each job's
+# speed drops to roughly workers / jobs instead of every upload slowing
+# down at once as they compete for cores.
+#
+# Every job has a JSON record on disk (status, progress) and every finished
+# slice is a checkpoint file; the finished result goes into the landmark
+# cache, where the app picks it up like any other cache hit. After a
+# restart, queued and running jobs are picked up again and only the
+# slices without a checkpoint are run; a job with every slice checkpointed
+# goes straight to stitching. Each slice's stage timings are
+# stored in its checkpoint and merged into the job record's
+# ``diagnostics`` when the job finishes.
+
+JOB_DIR = Path(os.environ.get(
+    "POSE_JOB_DIR", Path.home() / ".cache" / "pose_estimation" / "jobs"
+))
+
+# Each worker's pipeline keeps a decode and an inference thread busy.
+INFERENCE_WORKERS = int(os.environ.get(
+    "POSE_INFERENCE_WORKERS", max(1, (os.cpu_count() or 1) // 2)
+))
+SLICE_FRAMES = 600
+PROGRESS_SECONDS = 1.0
+# Finished, failed and cancelled job records are removed after this long.
+JOB_RETENTION_SECONDS = 24 * 3600
+
+ACTIVE = ("queued", "running", "refining")
+
+
+def job_id(digest, options):
+    """Jobs are keyed like the landmark cache entry they produce."""
+    return cache_key(digest, options)
+
+
+def plan_slices(frame_count, size=SLICE_FRAMES):
+    """``[(start, end)]`` slices of ``size`` frames covering the video.
+
+    The last slice is open-ended (``end=None``) so frames past an
+    underestimated ``CAP_PROP_FRAME_COUNT`` are still decoded.
+    """
+    starts = list(range(0, max(frame_count, 1), size))
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def eta_seconds(job):
+    """Remaining time at the job's current speed, or None if unknown."""
+    remaining = job["frame_count"] - job["frames_done"]
+    if job["status"] != "running" or not job["current_fps"] or remaining <= 0:
+        return None
+    return remaining / job["current_fps"]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueue:
+    """Durable extraction jobs, run slice by slice on a fixed worker pool.
+
+    ``submit`` returns immediately; poll ``status`` for progress and
+    ``stats`` for scheduler load. Use ``job_queue()`` for the process-wide
+    instance.
+    """
+
+    def __init__(self, job_dir=JOB_DIR, workers=INFERENCE_WORKERS):
+        self.job_dir = Path(job_dir)
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._jobs = {}      # id -> record
+        self._cancel = {}    # id -> threading.Event
+        self._pending = {}   # id -> deque of (start, end) slices not started
+        self._running = {}   # id -> {slice start: frames done}
+        self._done = {}      # id -> frames in finished slices
+        self._served = {}    # id -> monotonic time of its last dispatch
+        self._speed = {}     # id -> (monotonic time, frames) of the last sample
+        self._busy = 0
+        self._resume()
+        for _ in range(self.workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    # Records ------------------
+
+    def _dir(self, jid):
+        return self.job_dir / jid
+
+    def _save(self, job):
+        path = self._dir(job["id"]) / "job.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp, path)  # readers never see a half-written record
+
+    def _update(self, job, **fields):
+        with self._cond:
+            job.update(fields, updated=time.time())
+            self._save(job)
+
+    def _resume(self):
+        now = time.time()
+        records = []
+        for path in self.job_dir.glob("*/job.json"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job["status"] in ACTIVE:
+                records.append(job)
+            elif now - job["updated"] > JOB_RETENTION_SECONDS:
+                shutil.rmtree(path.parent, ignore_errors=True)
+
+        complete = []
+        for job in sorted(records, key=lambda j: j["submitted"]):
+            jid = job["id"]
+            self._jobs[jid] = job
+            self._cancel[jid] = threading.Event()
+            if not hold(Path(job["video_path"])):
+                self._update(job, status="failed",
+                             error="The video is no longer available.")
+                continue
+            try:
+                self._plan(job)
+            except Exception as exc:
+                release(Path(job["video_path"]))
+                self._update(job, status="failed", error=str(exc) or repr(exc))
+                continue
+            if self._pending[jid]:
+                self._update(job, status="queued", queued_at=now, started=None)
+            else:
+                # Every slice was checkpointed; only stitching (and the
+                # tiered refinement) was lost. No worker will pick it up.
+                self._update(job, status="running", queued_at=now, started=now)
+                complete.append(job)
+        for job in complete:
+            threading.Thread(target=self._finish, args=(job,), daemon=True).start()
+
+    def _plan(self, job):
+        """Queue the slices of ``job`` that have no checkpoint yet."""
+        jid = job["id"]
+        probe = FramePipeline(job["video_path"])
+        slices = plan_slices(probe.frame_count)
+        sizes = {s: (e if e is not None else max(probe.frame_count, s)) - s
+                 for s, e in slices}
+        done = set()
+        for path in self._chunks(jid):
+            start = int(path.stem)
+            with np.load(path) as data:
+                frames = len(data["landmarks"])
+            # The open-ended last slice may be longer or shorter than planned.
+            if start in sizes and (frames == sizes[start] or start == slices[-1][0]):
+                done.add(start)
+            else:
+                path.unlink(missing_ok=True)  # from another slice size
+        job.update(frame_count=probe.frame_count, fps=probe.fps,
+                   frame_size=list(probe.frame_size),
+                   frames_done=sum(sizes[s] for s in done))
+        self._pending[jid] = deque(sl for sl in slices if sl[0] not in done)
+        self._running[jid] = {}
+        self._done[jid] = job["frames_done"]
+        self._served[jid] = time.monotonic()
+        self._speed[jid] = (time.monotonic(), job["frames_done"])
+
+    # Public API ------------------
+
+    def submit(self, digest, video_path, options, video=None):
+        """Queue extraction of ``video_path``; returns the job id.
+
+        An active job for the same video and options is reused. Finished,
+        failed and cancelled ones start over from frame 0.
+        """
+        jid = job_id(digest, options)
+        with self._cond:
+            job = self._jobs.get(jid)
+            if job and job["status"] in ACTIVE:
+                return jid
+            if not hold(Path(video_path)):
+                raise FileNotFoundError(video_path)
+            now = time.time()
+            job = {
+                "id": jid, "digest": digest, "video_path": str(video_path),
+                "video": video, "options": options, "status": "queued",
+                "frame_count": 0, "fps": 0.0, "frame_size": [0, 0],
+                "frames_done": 0, "current_fps": 0.0, "error": None,
+                "diagnostics": None,
+                "submitted": now, "queued_at": now, "started": None,
+                "updated": now,
+            }
+            self._dir(jid).mkdir(exist_ok=True)
+            self._clear_chunks(jid)
+            try:
+                self._plan(job)
+            except BaseException:
+                release(Path(video_path))
+                raise
+            self._jobs[jid] = job
+            self._cancel[jid] = threading.Event()
+            self._save(job)
+            self._cond.notify_all()
+        return jid
+
+    def status(self, jid):
+        """A copy of the job record, or None for an unknown job.
+
+        ``wait_seconds`` is how long the job waited for its first worker
+        (so far, while it is still queued).
+        """
+        with self._cond:
+            job = self._jobs.get(jid)
+            if not job:
+                return None
+            job = dict(job)
+        job["wait_seconds"] = (job["started"] or time.time()) - job["queued_at"]
+        return job
+
+    def stats(self):
+        """Scheduler load: ``workers``, ``busy`` workers, ``queue_depth``
+        (slices waiting for a worker) and, per active job, its slices
+        ``running`` and ``pending`` and its ``wait_seconds``."""
+        now = time.time()
+        with self._cond:
+            jobs = [
+                {
+                    "id": jid, "video": job["video"], "status": job["status"],
+                    "running": len(self._running.get(jid, ())),
+                    "pending": len(self._pending.get(jid, ())),
+                    "wait_seconds": (job["started"] or now) - job["queued_at"],
+                }
+                for jid, job in self._jobs.items() if job["status"] in ACTIVE
+            ]
+            return {
+                "workers": self.workers,
+                "busy": self._busy,
+                "queue_depth": sum(len(p) for p in self._pending.values()),
+                "jobs": jobs,
+            }
+
+    def cancel(self, jid):
+        """Stop a job; its checkpoints are discarded."""
+        with self._cond:
+            job = self._jobs.get(jid)
+            if not job or job["status"] not in ACTIVE:
+                return
+            self._cancel[jid].set()
+            self._pending[jid].clear()
+            if not self._running[jid]:
+                self._close(job)
+
+    # Scheduling ------------------
+
+    def _next_slice(self):
+        """``(job id, start, end)`` of the slice to run next, or None."""
+        waiting = [jid for jid, pending in self._pending.items() if pending]
+        if not waiting:
+            return None
+        # Fewest slices in flight first, then round-robin.
+        jid = min(waiting, key=lambda j: (len(self._running[j]), self._served[j]))
+        start, end = self._pending[jid].popleft()
+        self._running[jid][start] = 0
+        self._served[jid] = time.monotonic()
+        job = self._jobs[jid]
+        if job["status"] == "queued":
+            self._speed[jid] = (time.monotonic(), job["frames_done"])
+            job.update(status="running", started=time.time(), updated=time.time())
+            self._save(job)
+        return jid, start, end
+
+    def _close(self, job):
+        """End an inactive job (caller holds the lock): final status, cleanup."""
+        jid = job["id"]
+        if self._cancel[jid].is_set():
+            status = "failed" if job["error"] else "cancelled"
+            self._clear_chunks(jid)
+        else:
+            status = "done"
+        job.update(status=status, current_fps=0.0, updated=time.time())
+        self._save(job)
+        for table in (self._pending, self._running, self._done,
+                      self._served, self._speed):
+            table.pop(jid, None)
+        release(Path(job["video_path"]))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next_slice()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_slice()
+                self._busy += 1
+            jid, start, end = task
+            job = self._jobs[jid]
+            try:
+                self._run_slice(job, start, end)
+            except JobCancelled:
+                pass
+            except Exception as exc:
+                with self._cond:
+                    job["error"] = job["error"] or str(exc) or repr(exc)
+                    self._cancel[jid].set()  # stops its other slices
+                    self._pending[jid].clear()
+
+            with self._cond:
+                self._busy -= 1
+                self._done[jid] += self._running[jid].pop(start)
+                finished = not self._pending[jid] and not self._running[jid]
+                if finished and self._cancel[jid].is_set():
+                    self._close(job)
+                    finished = False
+                self._cond.notify_all()
+            if finished:
+                self._finish(job)
+
+    def _progress(self, job, start, frames):
+        jid = job["id"]
+        with self._cond:
+            self._running[jid][start] = frames
+            last_time, last_frames = self._speed[jid]
+            now = time.monotonic()
+            if now - last_time < PROGRESS_SECONDS:
+                return
+            done = self._done[jid] + sum(self._running[jid].values())
+            self._speed[jid] = (now, done)
+            job.update(frames_done=done, updated=time.time(),
+                       current_fps=(done - last_frames) / (now - last_time))
+            self._save(job)
+
+    # Extraction ------------------
+
+    def _chunks(self, jid):
+        return sorted(self._dir(jid).glob("*.npz"))
+
+    def _clear_chunks(self, jid):
+        for p in self._chunks(jid):
+            p.unlink(missing_ok=True)
+
+    def _run_slice(self, job, start, end):
+        cancel = self._cancel[job["id"]]
+        options = dict(job["options"])
+        tiered = options.pop("tiered", False)
+
+        timer = StageTimer()
+        pipeline = FramePipeline(
+            job["video_path"], start=max(0, start - WARMUP_FRAMES), end=end,
+            timer=timer, model_complexity=LITE_COMPLEXITY if tiered else None,
+            **options
+        )
+        if start == 0:
+            seek_index(job["video_path"], job["digest"])  # for rep clips
+        size = (end if end is not None else max(job["frame_count"], start)) - start
+        buf = LandmarkBuffer(size)
+        sampled = []
+        for frame_no, lms in pipeline:
+            if cancel.is_set():
+                raise JobCancelled()
+            if frame_no < start:
+                continue  # warm-up
+            sampled.append(frame_no)
+            if lms is not None:
+                buf.put(frame_no - start, lms)
+            self._progress(job, start, frame_no + 1 - start)
+        if cancel.is_set():
+            raise JobCancelled()
+
+        # Frames after the last inferred one may have been skipped.
+        owned = max(0, pipeline.start + pipeline.decoded - start)
+        path = self._dir(job["id"]) / f"{start:010d}.npz"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, landmarks=buf.finish(owned),
+                     sampled=np.array(sampled, dtype=np.int64),
+                     timing=json.dumps({"samples": timer.samples,
+                                        "counters": timer.counters}))
+        os.replace(tmp, path)
+        with self._cond:
+            self._running[job["id"]][start] = owned
+
+    def _finish(self, job):
+        """Stitch the slices, refine if tiered and save to the cache."""
+        jid = job["id"]
+        try:
+            options = dict(job["options"])
+            tiered = options.pop("tiered", False)
+            chunks = self._chunks(jid)
+            end = 0
+            if chunks:
+                with np.load(chunks[-1]) as data:
+                    end = int(chunks[-1].stem) + len(data["landmarks"])
+
+            buf = LandmarkBuffer(end)
+            parts = [np.zeros(0, dtype=np.int64)]
+            timer = StageTimer()
+            for path in chunks:
+                with np.load(path) as data:
+                    buf.write(int(path.stem), data["landmarks"])
+                    parts.append(data["sampled"])
+                    timer.merge(_slice_timer(data))
+            landmarks, sampled = buf.finish(end), np.concatenate(parts)
+
+            if tiered:
+                self._update(job, status="refining")
+                lite_frames = len(sampled)
+                sampled, full_frames = refine_landmarks(job["video_path"], landmarks,
+                                                        sampled, timer, **options)
+            with timer.stage("motion"):
+                motion = motion_result(job["fps"], landmarks, sampled,
+                                       tuple(job["frame_size"]))
+            if tiered:
+                motion.update(lite_frames=lite_frames, full_frames=full_frames)
+            save_motion(job["digest"], job["options"], motion)
+            self._clear_chunks(jid)
+            job.update(frames_done=end, diagnostics=timer.summary())
+        except Exception as exc:
+            job["error"] = str(exc) or repr(exc)
+            self._cancel[jid].set()
+        with self._cond:
+            self._close(job)
+
+
+def _slice_timer(checkpoint):
+    """The ``StageTimer`` a slice stored in its checkpoint (empty for
+    checkpoints written without one)."""
+    timer = StageTimer()
+    if "timing" in checkpoint.files:
+        timing = json.loads(str(checkpoint["timing"]))
+        timer.samples, timer.counters = timing["samples"], timing["counters"]
+    return timer
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def job_queue():
+    """The process-wide ``JobQueue``; created (resuming jobs) on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
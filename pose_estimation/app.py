@@ -1,174 +1,458 @@
 import streamlit as st
-import cv2
-import mediapipe as mp
-import numpy as np
 import matplotlib.pyplot as plt
-from scipy.signal import find_peaks
-import tempfile
+import time
 import pandas as pd
+from contextlib import nullcontext
+
+from analysis_jobs import ACTIVE, eta_seconds, job_id, job_queue
+from exercise_profiles import (
+    DEFAULT_PROFILE,
+    PROFILES,
+    profile_reps,
+    profile_signal,
+    sample_rate,
+)
+from landmark_cache import load_motion, save_motion
+from landmark_store import npz_bytes, parquet_bytes
+from motion_chart import plot_reps, plot_signal
+from movement_compare import compare_reps
+from live_analysis import LATENCY_BUDGET, LiveSession
+from overlay_video import OverlayWriter, SessionOverlay, render_overlay
+from pose_pipeline import POSE_POOL, POSE_SETTINGS, FramePipeline, extract_motion
+from rep_analysis import summarize_reps
+from rep_clips import frame_time, rep_clip, rep_strip, rep_window, seek_index
+from rep_period import rest_mask, runs
+from stage_timer import NULL_TIMER, StageTimer, write_log
+from threshold_tuning import tune_thresholds
+from upload_store import SessionUploads, UploadQuotaError
+from workout_history import (
+    DEFAULT_USER,
+    load_thresholds,
+    recent_sessions,
+    save_session,
+    save_thresholds,
+    users,
+    weekly_trends,
+)
+
+# Larger uploads aren't previewed: st.video re-hashes the whole file on
+# every rerun.
+PREVIEW_MAX_BYTES = 200 * 1024 * 1024
+# How often the page re-reads a running analysis job's progress.
+JOB_POLL_SECONDS = 1.0
 
 st.set_page_config(page_title="AI Workout Analysis", layout="wide")
-st.title("🏋️ AI Workout Motion & Injury Risk Analysis")
 
-st.markdown("""
-Upload your workout video.  
-The system will analyze **rep quality**, **depth**, and **potential injury risk moments**.
-""")
-# ================== SIDEBAR SETTINGS ==================
-st.sidebar.header("⚙️ Analysis Settings")
 
-GOOD_T = st.sidebar.slider("Good Rep Threshold", 0.015, 0.03, 0.022)
-BAD_T = st.sidebar.slider("Bad Rep Threshold", 0.008, 0.02, 0.013)
-# ================= Upload Video =================
-video_file = st.file_uploader("Upload workout video", type=["mp4", "mov", "avi"])
+@st.cache_resource
+def warm_pose_pool():
+    # Once per server process: the first analysis skips model start-up.
+    POSE_POOL.warm(**POSE_SETTINGS)
+    return POSE_POOL
 
-if video_file:
-    tfile = tempfile.NamedTemporaryFile(delete=False)
-    tfile.write(video_file.read())
-    video_path = tfile.name
-
-    st.video(video_file)
-
-    # ================= MediaPipe Setup =================
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(
-        static_image_mode=False,
-        model_complexity=1,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
 
-    cap = cv2.VideoCapture(video_path)
-    FPS = cap.get(cv2.CAP_PROP_FPS)
-    if FPS == 0 or FPS is None:
-        FPS = 30
+@st.cache_resource
+def start_job_queue():
+    # Once per server process, before any upload is ingested: resumed jobs
+    # hold their videos before an ingest's quota check could evict them.
+    return job_queue()
 
-    TRACK_POINTS = [
-        mp_pose.PoseLandmark.RIGHT_HIP.value,
-        mp_pose.PoseLandmark.RIGHT_KNEE.value,
-        mp_pose.PoseLandmark.RIGHT_ANKLE.value
-    ]
 
-    prev_points = None
-    movement_values = []
-    frame_index = []
-    frame_no = 0
+# Export files are built once per landmark set, not on every rerun; ``key``
+# is the landmark cache key, so the (unhashed) landmarks need no hashing.
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_bytes(key, fmt, _landmarks, fps):
+    return (npz_bytes if fmt == "npz" else parquet_bytes)(_landmarks, fps)
 
-    # ================= Extract Motion =================
-    with st.spinner("Analyzing motion..."):
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
 
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            result = pose.process(rgb)
+warm_pose_pool()
+jobs = start_job_queue()
+st.title("🏋️ AI Workout Motion & Injury Risk Analysis")
 
-            if result.pose_landmarks:
-                lm = result.pose_landmarks.landmark
-                curr_points = np.array([[lm[p].x, lm[p].y] for p in TRACK_POINTS])
+st.markdown("""
+Upload your workout video.  
+The system will analyze **rep quality**, **depth**, and **potential injury risk moments**.
+""")
+# ================== SIDEBAR SETTINGS ==================
+st.sidebar.header("⚙️ Analysis Settings")
 
-                if prev_points is not None:
-                    diffs = np.linalg.norm(curr_points - prev_points, axis=1)
-                    movement_values.append(np.mean(diffs))
-                    frame_index.append(frame_no)
+MODE = st.sidebar.radio("Mode", ["Upload Video", "Live Camera", "Workout History"])
+# History can only show athletes with saved sessions, so pick from those.
+KNOWN_USERS = users() if MODE == "Workout History" else []
+if KNOWN_USERS:
+    USER = st.sidebar.selectbox(
+        "Athlete", KNOWN_USERS,
+        index=KNOWN_USERS.index(DEFAULT_USER) if DEFAULT_USER in KNOWN_USERS else 0
+    )
+else:
+    USER = st.sidebar.text_input(
+        "Athlete", DEFAULT_USER,
+        help="Analyzed uploads are saved to this athlete's workout history."
+    ).strip() or DEFAULT_USER
+
+# ================= Workout History =================
+if MODE == "Workout History":
+    st.subheader("🗓️ Workout History")
+
+    exercise = st.sidebar.selectbox(
+        "Exercise", [None, *PROFILES],
+        format_func=lambda name: "All" if name is None else PROFILES[name]["label"]
+    )
+    weeks = st.sidebar.slider("Weeks", 4, 104, 12)
+    since = (pd.Timestamp.now().normalize() - pd.Timedelta(weeks=weeks)).strftime("%Y-%m-%d")
+
+    trends = weekly_trends(USER, exercise, since)
+    if trends.empty:
+        st.info(f"No saved sessions for {USER} in the last {weeks} weeks.")
+        st.stop()
+
+    trends = trends.set_index("week")
+    h1, h2, h3 = st.columns(3)
+    h1.metric("Sessions", int(trends["sessions"].sum()))
+    h2.metric("Reps", int(trends["reps"].sum()))
+    h3.metric("Avg Depth (last week)", f"{trends['avg_depth'].iloc[-1]:.0f}/100")
+
+    st.markdown("**Average depth**")
+    st.line_chart(trends["avg_depth"])
+    st.markdown("**Good-rep and risk-flag ratio**")
+    st.line_chart(trends[["good_ratio", "risk_ratio"]])
+
+    st.markdown("**Recent sessions**")
+    st.dataframe(recent_sessions(USER, exercise, since), use_container_width=True)
+    st.stop()
+
+# The live counter only knows the general joint-movement signal.
+EXERCISE = DEFAULT_PROFILE
+if MODE == "Upload Video":
+    EXERCISE = st.sidebar.selectbox(
+        "Exercise", list(PROFILES),
+        index=list(PROFILES).index(DEFAULT_PROFILE),
+        format_func=lambda name: PROFILES[name]["label"],
+        help="Switching exercise reuses the extracted landmarks."
+    )
+PROFILE = PROFILES[EXERCISE]
+
+# Thresholds tuned to this athlete's labelled reps replace the defaults.
+TUNED = load_thresholds(EXERCISE, user=USER)
+USE_TUNED = TUNED is not None and st.sidebar.checkbox(
+    "Use Tuned Thresholds", value=True,
+    help=f"Thresholds auto-tuned for {USER} on this exercise."
+)
+if USE_TUNED:
+    PROFILE = {**PROFILE, "thresholds": {**PROFILE["thresholds"], **TUNED}}
+
+GOOD_T = st.sidebar.slider(
+    "Good Rep Threshold", *PROFILE["good_range"], PROFILE["thresholds"]["good_t"]
+)
+BAD_T = st.sidebar.slider(
+    "Bad Rep Threshold", *PROFILE["bad_range"], PROFILE["thresholds"]["bad_t"]
+)
+
+AUTO_SPACING = st.sidebar.checkbox(
+    "Auto Rep Spacing", value=True,
+    help="Derive peak spacing and height from your rep tempo and skip "
+         "rest periods between sets."
+)
+
+SAMPLING = st.sidebar.radio("Inference Rate", ["Every frame", "Adaptive"])
+TARGET_FPS = None
+if SAMPLING == "Adaptive":
+    TARGET_FPS = st.sidebar.slider(
+        "Target Analysis FPS", 5, 30, 10,
+        help="Lower is faster but less precise. Inference returns to full "
+             "frame rate while you are moving."
+    )
 
-                prev_points = curr_points
-            frame_no += 1
+INFERENCE_SIZE = st.sidebar.selectbox(
+    "Inference Resolution", [None, 960, 640, 480],
+    index=2, format_func=lambda s: "Native" if s is None else f"{s}px"
+)
+TRACK_ROI = st.sidebar.checkbox(
+    "Crop to Person", value=True,
+    help="Run pose detection only on the region around the athlete."
+)
+TIERED = st.sidebar.checkbox(
+    "Fast Model", value=False,
+    help="Run the lite pose model and re-check only rep peaks and "
+         "low-confidence frames with the full model."
+)
+OVERLAY = st.sidebar.checkbox(
+    "Annotated Video", value=False,
+    help="Render the skeleton, rep count and rep quality onto the video "
+         "during analysis, for download."
+)
+OVERLAY_HEIGHT, OVERLAY_FPS = None, None
+if OVERLAY:
+    OVERLAY_HEIGHT = st.sidebar.selectbox(
+        "Video Resolution", [None, 720, 480, 360],
+        index=2, format_func=lambda h: "Native" if h is None else f"{h}p"
+    )
+    OVERLAY_FPS = st.sidebar.slider(
+        "Video FPS", 5, 30, 30,
+        help="Capped at the source frame rate."
+    )
+DIAGNOSTICS = st.sidebar.checkbox(
+    "Show Diagnostics", value=False,
+    help="Time every processing stage and log the results."
+)
+# ================= Live Camera =================
+if MODE == "Live Camera":
+    st.subheader("🎥 Live Rep Counter")
+
+    source = st.text_input(
+        "Camera index, or a video file path to replay in real time", "0"
+    )
+    budget = st.sidebar.slider(
+        "Latency Budget (s)", 0.05, 1.0, LATENCY_BUDGET,
+        help="Frames that can't be analyzed within this delay are skipped."
+    )
 
-        cap.release()
+    if st.checkbox("Start live analysis"):
+        source = source.strip()
+        source = int(source) if source.isdigit() else source
 
-    movement_values = np.array(movement_values)
+        c1, c2, c3, c4 = st.columns(4)
+        reps_box, depth_box, risk_box, latency_box = (
+            c1.empty(), c2.empty(), c3.empty(), c4.empty()
+        )
+        frame_box = st.empty()
+        status_box = st.empty()
+        alerts = st.container()
+
+        session = LiveSession(source, latency_budget=budget, good_t=GOOD_T, bad_t=BAD_T)
+        last_draw = 0.0
+        for state in session:
+            for rep in state["new_reps"]:
+                if rep["injury_risk"]:
+                    alerts.error(f"Rep {rep['rep']} | Time: {rep['time']}s | {rep['reason']}")
+
+            reps = state["reps"]
+            reps_box.metric("Reps", len(reps))
+            depth_box.metric("Last Depth", f"{reps[-1]['depth']}/100" if reps else "-")
+            risk_box.metric("Risky Moments", sum(1 for r in reps if r["injury_risk"]))
+            latency_box.metric("Latency", f"{state['latency'] * 1000:.0f} ms")
+
+            # Redrawing the image is the expensive part; cap it at ~10 Hz.
+            now = time.monotonic()
+            if state["frame"] is not None and now - last_draw > 0.1:
+                frame_box.image(state["frame"], channels="BGR")
+                last_draw = now
+            status_box.caption(
+                f"Processed {state['processed']} frames, "
+                f"dropped {state['dropped']} to stay within budget"
+            )
 
-    # ================= Rep Detection =================
-    peaks, _ = find_peaks(movement_values, height=0.012, distance=16)
+        st.success("Live session finished.")
+    st.stop()
 
-    GOOD_T = 0.022
-    BAD_T = 0.013
-    WINDOW = 12
-    MAX_AMP = 0.05
+# ================= Upload Video =================
+video_file = st.file_uploader("Upload workout video", type=["mp4", "mov", "avi"])
 
-    rep_feedback = []
+if video_file:
+    if video_file.size <= PREVIEW_MAX_BYTES:
+        st.video(video_file)
+    else:
+        st.caption(f"Preview skipped for uploads over {PREVIEW_MAX_BYTES // 2**20} MB.")
+
+    options = {
+        "target_fps": TARGET_FPS,
+        "inference_size": INFERENCE_SIZE,
+        "track_roi": TRACK_ROI,
+        "tiered": TIERED
+    }
+
+    # Stream each upload to disk once per session; reruns reuse the file.
+    uploads = st.session_state.setdefault("uploads", SessionUploads())
+    try:
+        digest, video_path = uploads.get(video_file)
+    except UploadQuotaError as e:
+        st.error(f"Not enough upload space right now: {e}")
+        st.stop()
+
+    timer = StageTimer() if DIAGNOSTICS else NULL_TIMER
+
+    # The annotated video is rendered by a writer thread fed from the
+    # analysis pass, so it is keyed like the landmarks plus its own settings.
+    # Its rep labels use the general signal, so only those thresholds apply.
+    general = PROFILES[DEFAULT_PROFILE]["thresholds"]
+    overlay_t = ((GOOD_T, BAD_T) if EXERCISE == DEFAULT_PROFILE
+                 else (general["good_t"], general["bad_t"]))
+    overlay_key = (digest, tuple(options.items()), overlay_t,
+                   OVERLAY_HEIGHT, OVERLAY_FPS)
+    overlays = st.session_state.setdefault("overlays", SessionOverlay())
+    writer = None
+    if OVERLAY and overlays.path(overlay_key) is None:
+        probe = FramePipeline(video_path)
+        writer = OverlayWriter(overlays.new(), probe.fps, probe.frame_size,
+                               out_height=OVERLAY_HEIGHT, out_fps=OVERLAY_FPS,
+                               good_t=overlay_t[0], bad_t=overlay_t[1])
 
-    # ================= Rep Analysis =================
-    for i, peak in enumerate(peaks):
-        seg = movement_values[max(0, peak-WINDOW):min(len(movement_values), peak+WINDOW)]
-        amp = float(np.max(seg) - np.min(seg))
-        depth = min(100, int((amp / MAX_AMP) * 100))
+    # ================= Extract Motion =================
+    with timer.stage("cache_lookup"):
+        motion = load_motion(digest, options)
+
+    # Extraction runs as a background job (see analysis_jobs); the page polls
+    # it and picks the result up from the cache. Only an annotated video
+    # export runs in this request, since its writer is fed from the pass.
+    jid = job_id(digest, options)
+    if motion is None and not writer:
+        # The timings of the decode are in the job record (see below).
+        st.session_state["awaited_job"] = jid
+        job = jobs.status(jid)
+        if job and job["status"] == "done":  # finished since the lookup
+            motion = load_motion(digest, options)
+        if motion is None:
+            if job is None or job["status"] == "done":
+                jobs.submit(digest, video_path, options, video=video_file.name)
+                job = jobs.status(jid)
+
+            # Polled within this run, like the live counter: every rerun
+            # would rebuild the upload's preview (a full copy and hash).
+            status_box, cancel_box = st.empty(), st.empty()
+            if job["status"] in ACTIVE and cancel_box.button("Cancel analysis"):
+                jobs.cancel(jid)
+            while job["status"] in ACTIVE:
+                load = jobs.stats()
+                with status_box.container():
+                    if job["status"] == "queued":
+                        st.info(
+                            f"Waiting for a free analysis worker... "
+                            f"({load['queue_depth']} batches queued, "
+                            f"waiting {job['wait_seconds']:.0f} s)"
+                        )
+                    elif job["status"] == "refining":
+                        st.info("Re-checking rep peaks with the full model...")
+                    else:
+                        total, done = job["frame_count"], job["frames_done"]
+                        st.progress(min(1.0, done / total) if total else 0.0,
+                                    text=f"Analyzing motion... {done} of {total} frames")
+                        eta = eta_seconds(job)
+                        share = next((j["running"] for j in load["jobs"] if j["id"] == jid), 0)
+                        j1, j2, j3 = st.columns(3)
+                        j1.metric("Speed", f"{job['current_fps']:.1f} FPS")
+                        j2.metric("Time Left", "-" if eta is None else f"{eta:.0f} s")
+                        j3.metric("Workers", f"{share} of {load['workers']}",
+                                  help=f"{len(load['jobs'])} analyses are sharing the workers.")
+                time.sleep(JOB_POLL_SECONDS)
+                job = jobs.status(jid)
+            status_box.empty()
+            cancel_box.empty()
+
+            if job["status"] == "done":
+                motion = load_motion(digest, options)
+            if motion is None:
+                if job["status"] == "failed":
+                    st.error(f"Analysis failed: {job['error']}")
+                elif job["status"] == "done":
+                    # Rerunning would resubmit the same job; don't loop.
+                    st.error("Analysis finished, but its result could not be "
+                             "read back from the landmark cache.")
+                else:
+                    st.warning("Analysis cancelled.")
+                if st.button("Restart analysis"):
+                    jobs.submit(digest, video_path, options, video=video_file.name)
+                    st.rerun()
+                st.stop()
+
+    # A result this session waited for was just decoded by the job, not
+    # loaded from an earlier run.
+    job_diagnostics = None
+    if motion is not None and st.session_state.get("awaited_job") == jid:
+        job_diagnostics = (jobs.status(jid) or {}).get("diagnostics")
+    cache_hit = motion is not None and job_diagnostics is None
+
+    with writer or nullcontext():  # waits for the last frames to encode
+        if motion is None:
+            with st.spinner("Analyzing motion..."):
+                # Frames reach the writer in order from a single pass.
+                motion = extract_motion(video_path, timer=timer,
+                                        frame_sink=writer.submit, **options)
+            save_motion(digest, options, motion)
+        elif writer:
+            with st.spinner("Rendering annotated video..."), timer.stage("overlay"):
+                render_overlay(video_path, motion["landmarks"], writer)
+    if writer:
+        overlays.finished(overlay_key)
+
+    st.caption(
+        f"Pose inference ran on {motion['inferred_frames']} of "
+        f"{motion['frame_count']} frames "
+        f"({motion['inference_fps']:.1f} effective inference FPS)"
+    )
+    if "lite_frames" in motion:
+        st.caption(
+            f"Lite model: {motion['lite_frames']} frames, "
+            f"full model: {motion['full_frames']} frames"
+        )
 
-        if amp >= GOOD_T:
-            status, color = "GOOD", "green"
-        elif amp >= BAD_T:
-            status, color = "BAD", "orange"
-        else:
-            status, color = "POOR", "red"
-
-        injury_risk = False
-        reason = None
-
-        if status == "POOR":
-            injury_risk = True
-            reason = "Very low depth may increase joint strain"
-
-        if amp > 0.045:
-            injury_risk = True
-            reason = "Sudden uncontrolled movement spike"
-
-        if i > 0 and status != "GOOD" and rep_feedback[-1]["status"] == "GOOD":
-            injury_risk = True
-            reason = "Quality drop after good rep (fatigue)"
-
-        rep_feedback.append({
-            "rep": i + 1,
-            "frame": frame_index[peak],
-            "time": round(frame_index[peak] / FPS, 2),
-            "depth": depth,
-            "status": status,
-            "color": color,
-            "injury_risk": injury_risk,
-            "reason": reason
-        })
+    FPS = motion["fps"]
+    with timer.stage("signal"):
+        movement_values, frame_index = profile_signal(motion, PROFILE)
+
+    # ================= Rep Detection & Analysis =================
+    reps = profile_reps(movement_values, frame_index, FPS, PROFILE,
+                        good_t=GOOD_T, bad_t=BAD_T, adaptive=AUTO_SPACING,
+                        timer=timer)
+    summary = summarize_reps(reps)
+    rep_feedback = pd.DataFrame(reps)
+
+    # Saved once per result; reruns and replays of the same video update it.
+    history_key = (USER, EXERCISE, digest, GOOD_T, BAD_T, AUTO_SPACING,
+                   USE_TUNED, tuple(options.items()))
+    if st.session_state.get("history_saved") != history_key:
+        with timer.stage("history"):
+            save_session(reps, EXERCISE, digest, user=USER, video=video_file.name)
+        st.session_state["history_saved"] = history_key
 # ================== KPI DASHBOARD ==================
     st.subheader("📊 Workout Summary")
 
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Total Reps", len(rep_feedback))
-    c2.metric("Good Reps", sum(1 for r in rep_feedback if r["status"] == "GOOD"))
-    c3.metric("Needs Improvement", sum(1 for r in rep_feedback if r["status"] == "BAD"))
-    c4.metric("Risky Moments", sum(1 for r in rep_feedback if r["injury_risk"]))
+    c1.metric("Total Reps", summary["total"])
+    c2.metric("Good Reps", summary["good"])
+    c3.metric("Needs Improvement", summary["bad"])
+    c4.metric("Risky Moments", summary["risky"])
    
     # ================= Plot =================
     st.subheader("📈 Motion Analysis Graph")
 
+    plot_t0 = timer.clock()
     fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(frame_index, movement_values, label="Avg Joint Movement", color="blue")
+    plot_signal(ax, frame_index, movement_values, keep=reps["peak"],
+                label=PROFILE["signal_label"], color="blue")
 
-    ax.axhspan(GOOD_T, 0.06, color="green", alpha=0.08, label="Good Zone")
+    ax.axhspan(GOOD_T, PROFILE["plot_max"], color="green", alpha=0.08, label="Good Zone")
     ax.axhspan(BAD_T, GOOD_T, color="orange", alpha=0.08, label="Improve Zone")
     ax.axhspan(0, BAD_T, color="red", alpha=0.08, label="Poor Zone")
 
-    for rep in rep_feedback:
-        y = movement_values[frame_index.index(rep["frame"])]
-        ax.scatter(rep["frame"], y, color=rep["color"], s=80, edgecolors="black")
+    plot_reps(ax, reps, s=80)
 
-    ax.set_ylim(0, 0.06)
+    if AUTO_SPACING:
+        rest = rest_mask(movement_values, sample_rate(frame_index, FPS))
+        for i, (start, end) in enumerate(runs(rest)):
+            ax.axvspan(frame_index[start], frame_index[end - 1], color="gray",
+                       alpha=0.2, label=None if i else "Rest")
+
+    ax.set_ylim(0, PROFILE["plot_max"])
     ax.set_xlabel("Frame")
-    ax.set_ylabel("Avg Joint Movement")
+    ax.set_ylabel(PROFILE["signal_label"])
     ax.legend()
     ax.grid(True)
 
     st.pyplot(fig)
+    plt.close(fig)
+    timer.record("plot", plot_t0)
+    if AUTO_SPACING and len(reps["period"]) and not pd.isna(reps["period"]).all():
+        st.caption(f"Rep tempo: one rep every {pd.Series(reps['period']).median():.1f}s")
 
     # ================== INJURY RISK LIST ==================
     st.subheader("⚠️ Potential Injury Risk Moments")
 
-    any_risk = False
-    for r in rep_feedback:
-        if r["injury_risk"]:
-            any_risk = True
-            st.error(
-                f"Rep {r['rep']} | Time: {r['time']}s | {r['reason']}"
-            )
+    risky = rep_feedback[rep_feedback["injury_risk"]]
+    any_risk = not risky.empty
+    for r in risky.itertuples():
+        st.error(
+            f"Rep {r.rep} | Time: {r.time}s | {r.reason}"
+        )
 
     if not any_risk:
         st.success("No major risk patterns detected. Great form!")
@@ -176,11 +460,96 @@ if video_file:
     # REP TABLE ==================
     st.subheader("📋 Rep-wise Breakdown")
 
-    df = pd.DataFrame(rep_feedback)[
+    df = rep_feedback[
         ["rep", "status", "depth", "time", "injury_risk"]
+        + (["period"] if AUTO_SPACING else [])
     ]
     st.dataframe(df, use_container_width=True)
 
+    # Only the selected rep's window is decoded, from the keyframe before it.
+    rep_labels = {
+        r.rep: f"Rep {r.rep} | {r.time}s | {r.status}" + (" ⚠️" if r.injury_risk else "")
+        for r in rep_feedback.itertuples()
+    }
+    review = st.selectbox(
+        "Review a rep", [None, *rep_labels],
+        format_func=lambda r: "Select a rep..." if r is None else rep_labels[r],
+    )
+    if review is not None:
+        row = rep_feedback[rep_feedback["rep"] == review].iloc[0]
+        seek = seek_index(video_path, digest)
+        start, end = rep_window(seek, int(row["frame"]), PROFILE["thresholds"]["window"])
+        with st.spinner("Cutting rep clip..."), timer.stage("rep_clip"):
+            strip = rep_strip(video_path, digest, start, end)
+            clip = rep_clip(video_path, digest, start, end)
+        st.image(
+            str(strip),
+            caption=f"Rep {review}: {frame_time(seek, start):.2f}s to "
+                    f"{frame_time(seek, end - 1):.2f}s",
+        )
+        st.download_button(
+            label="⬇️ Rep Clip (.mp4)",
+            data=clip.read_bytes(),
+            file_name=f"rep_{review}.mp4",
+            mime="video/mp4"
+        )
+
+    # ================= Threshold Auto-Tuning =================
+    # Sweeps the thresholds on the signal already on screen; no re-extraction.
+    with st.expander("🎯 Auto-Tune Thresholds"):
+        st.caption(
+            "Label a few reps by the time of their deepest point: GOOD, BAD or "
+            "POOR (optionally with a 0-100 depth), or NONE for a detection that "
+            "isn't a rep."
+        )
+        labels = st.data_editor(
+            pd.DataFrame({
+                "time": rep_feedback["time"].astype(float),
+                "label": pd.Series([None] * len(rep_feedback), dtype=object),
+                "depth": pd.Series([None] * len(rep_feedback), dtype=float),
+            }),
+            column_config={
+                "time": st.column_config.NumberColumn("Time (s)", min_value=0.0, step=0.01),
+                "label": st.column_config.SelectboxColumn(
+                    "Label", options=["GOOD", "BAD", "POOR", "NONE"]),
+                "depth": st.column_config.NumberColumn("Depth", min_value=0, max_value=100),
+            },
+            num_rows="dynamic", hide_index=True, key=f"tune_labels_{digest}_{EXERCISE}",
+        ).dropna(subset=["time", "label"])
+
+        if st.button("Run Auto-Tune", disabled=labels.empty):
+            try:
+                with st.spinner("Sweeping thresholds..."), timer.stage("threshold_tuning"):
+                    # Scored with the detector the counts above come from.
+                    st.session_state["tuned"] = (USER, EXERCISE, AUTO_SPACING, tune_thresholds(
+                        movement_values, frame_index, FPS,
+                        {"frame": (labels["time"] * FPS).round().astype(int).tolist(),
+                         "status": labels["label"].tolist(),
+                         "depth": labels["depth"].astype(float).tolist()},
+                        PROFILE, adaptive=AUTO_SPACING,
+                    ))
+            except ValueError as e:
+                st.error(str(e))
+
+        tuned = st.session_state.get("tuned")
+        if tuned is not None and tuned[:3] == (USER, EXERCISE, AUTO_SPACING):
+            result = tuned[3]
+            st.caption(
+                f"Fit {result['fit']:.2f} (1.00 = every label matched) over "
+                f"{result['combinations']:,} combinations and {result['labels']} labels."
+                + (" With Auto Rep Spacing, peak height and spacing only apply "
+                   "where no rep tempo is found." if AUTO_SPACING else "")
+            )
+            st.dataframe(pd.DataFrame({
+                "current": pd.Series(PROFILE["thresholds"]),
+                "suggested": pd.Series(result["thresholds"]),
+            }).loc[list(result["thresholds"])].astype(object), use_container_width=True)
+            if st.button(f"Save for {USER}"):
+                save_thresholds(result["thresholds"], EXERCISE, user=USER,
+                                fit=result["fit"], labels=result["labels"])
+                del st.session_state["tuned"]
+                st.rerun()
+
     # USER FEEDBACK ==================
     if any_risk:
         st.warning(
@@ -204,4 +573,146 @@ if video_file:
             data=csv,
             file_name="workout_report.csv",
             mime="text/csv"
-        )
\ No newline at end of file
+        )
+
+    # FULL-BODY LANDMARKS ==================
+    if st.checkbox("Export full-body landmarks"):
+        e1, e2 = st.columns(2)
+        e1.download_button(
+            label="⬇️ Landmarks (.npz)",
+            data=export_bytes(jid, "npz", motion["landmarks"], FPS),
+            file_name="landmarks.npz",
+            mime="application/octet-stream"
+        )
+        try:
+            parquet = export_bytes(jid, "parquet", motion["landmarks"], FPS)
+        except ImportError:
+            e2.caption("Install pyarrow to export Parquet.")
+        else:
+            e2.download_button(
+                label="⬇️ Landmarks (.parquet)",
+                data=parquet,
+                file_name="landmarks.parquet",
+                mime="application/octet-stream"
+            )
+
+    # ANNOTATED VIDEO ==================
+    if OVERLAY:
+        with open(overlays.path(overlay_key), "rb") as f:
+            st.download_button(
+                label="⬇️ Annotated Video (.mp4)",
+                data=f,
+                file_name="workout_annotated.mp4",
+                mime="video/mp4"
+            )
+        st.caption(
+            "Rep labels in the video come from the general joint-movement "
+            "signal, as in Live Camera mode."
+        )
+
+    # REFERENCE COMPARISON ==================
+    st.subheader("🆚 Compare with a Reference")
+    reference_file = st.file_uploader(
+        "Upload a coach's reference video of the same exercise",
+        type=["mp4", "mov", "avi"], key="reference_video"
+    )
+    if reference_file:
+        # Separate from ``uploads``, which releases everything but the
+        # session's latest upload.
+        references = st.session_state.setdefault("reference_uploads", SessionUploads())
+        try:
+            ref_digest, ref_path = references.get(reference_file)
+        except UploadQuotaError as e:
+            st.error(f"Not enough upload space right now: {e}")
+            st.stop()
+
+        reference = load_motion(ref_digest, options)
+        if reference is None:
+            ref_jid = job_id(ref_digest, options)
+            ref_job = jobs.status(ref_jid)
+            if ref_job is None or ref_job["status"] == "done":
+                jobs.submit(ref_digest, ref_path, options, video=reference_file.name)
+                ref_job = jobs.status(ref_jid)
+            # Same flow as the upload's job above.
+            ref_box, ref_cancel_box = st.empty(), st.empty()
+            if (ref_job["status"] in ACTIVE
+                    and ref_cancel_box.button("Cancel reference analysis")):
+                jobs.cancel(ref_jid)
+            while ref_job["status"] in ACTIVE:
+                total = ref_job["frame_count"]
+                ref_box.progress(min(1.0, ref_job["frames_done"] / total) if total else 0.0,
+                                 text="Analyzing reference video...")
+                time.sleep(JOB_POLL_SECONDS)
+                ref_job = jobs.status(ref_jid)
+            ref_box.empty()
+            ref_cancel_box.empty()
+
+            if ref_job["status"] == "done":
+                reference = load_motion(ref_digest, options)
+            if reference is None:
+                if ref_job["status"] == "failed":
+                    st.error(f"Reference analysis failed: {ref_job['error']}")
+                elif ref_job["status"] == "done":
+                    st.error("Reference analysis finished, but its result could "
+                             "not be read back from the landmark cache.")
+                else:
+                    st.warning("Reference analysis cancelled.")
+                if st.button("Restart reference analysis"):
+                    jobs.submit(ref_digest, ref_path, options, video=reference_file.name)
+                    st.rerun()
+                st.stop()
+
+        with timer.stage("compare"):
+            comparison = pd.DataFrame(compare_reps(motion, reference, PROFILE))
+        matched = comparison.dropna(subset=["deviation"])
+        if matched.empty:
+            st.info("No reps to compare in one of the two videos.")
+        else:
+            r1, r2, r3 = st.columns(3)
+            r1.metric("Avg Deviation", f"{matched['deviation'].mean():.3g}")
+            r2.metric("Avg Tempo", f"{matched['tempo_ratio'].mean():.2f}x reference")
+            r3.metric("Reference Reps", int(comparison["ref_rep"].max()))
+            st.dataframe(comparison.round(3), use_container_width=True)
+            st.caption(
+                f"Each rep is matched to its closest reference rep by dynamic "
+                f"time warping. Deviation is the mean gap in "
+                f"{PROFILE['signal_label']} along the alignment; tempo above "
+                f"1 is slower than the reference, and down/up_diff are the "
+                f"seconds slower (+) before/after the rep's peak."
+            )
+
+    # DIAGNOSTICS ==================
+    if timer.enabled:
+        diagnostics = timer.summary()
+        if job_diagnostics:
+            diagnostics = {
+                key: {**job_diagnostics[key], **diagnostics[key]}
+                for key in ("stages", "counters")
+            }
+        counters = diagnostics["counters"]
+        with st.expander("🩺 Diagnostics", expanded=False):
+            if cache_hit:
+                st.caption("Landmarks loaded from cache; no frames were decoded.")
+            elif job_diagnostics:
+                st.caption(
+                    "Landmarks extracted by a background job; decode and "
+                    "inference stages include each slice's warm-up frames."
+                )
+            d1, d2, d3, d4 = st.columns(4)
+            d1.metric("Frames", motion["frame_count"])
+            d2.metric("Inferred", motion["inferred_frames"])
+            d3.metric("Skipped", counters.get("skipped", "-" if cache_hit else 0))
+            d4.metric("Undetected", counters.get("undetected", "-" if cache_hit else 0))
+            st.dataframe(
+                pd.DataFrame.from_dict(diagnostics["stages"], orient="index").round(3),
+                use_container_width=True
+            )
+            st.caption(
+                "Decode runs in parallel with inference (and the job's slices "
+                "run in parallel), so stage totals can add up to more than the "
+                "wall time."
+            )
+        write_log(diagnostics, video=video_file.name, digest=digest,
+                  options=options, cache_hit=cache_hit,
+                  frame_count=motion["frame_count"],
+                  inferred_frames=motion["inferred_frames"])
\ No newline at end of file
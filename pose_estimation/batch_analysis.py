@@ -0,0 +1,248 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+from exercise_profiles import DEFAULT_PROFILE, PROFILES, profile_reps, profile_signal
+from landmark_cache import cached_extract_motion
+from rep_analysis import summarize_reps
+from sharded_pipeline import extract_motion_sharded
+
+# Batch analysis ------------------
+# Headless counterpart of the Streamlit uploader: analyzes every video in a
+# set of directories / globs with a pool of worker processes and writes a
+# rep report per video (CSV + JSON) plus one aggregate summary. A report
+# records the video's size, mtime and the analysis settings; videos whose
+# report still matches are skipped on the next run.
+#
+#   python batch_analysis.py sessions/ "archive/*.mp4" --out reports -j 4
+#
+# A single video to analyze is instead split into frame ranges across the
+# workers (see sharded_pipeline), so one long recording still uses every
+# core.
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
+
+# Bump when the report layout or the analysis behind it changes.
+REPORT_VERSION = 1
+
+SUMMARY_COLUMNS = ["video", "status", "total", "good", "bad", "poor", "risky",
+                   "duration", "report", "error"]
+
+
+def find_videos(patterns):
+    """Video files matched by directories (searched recursively) or globs."""
+    found = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = (p for p in path.rglob("*") if p.is_file())
+        else:
+            matches = (Path(p) for p in glob.glob(pattern, recursive=True))
+        found += [p for p in matches if p.suffix.lower() in VIDEO_EXTENSIONS]
+    return sorted({p.resolve() for p in found})
+
+
+def report_names(videos):
+    """Report file stem per video; clashing stems get their parent dir added."""
+    counts = {}
+    for v in videos:
+        counts[v.stem] = counts.get(v.stem, 0) + 1
+    return {
+        v: v.stem if counts[v.stem] == 1 else f"{v.parent.name}_{v.stem}"
+        for v in videos
+    }
+
+
+def video_stamp(video):
+    st = video.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def load_report(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_up_to_date(report, video, settings):
+    return (
+        report is not None
+        and report.get("version") == REPORT_VERSION
+        and report.get("source") == video_stamp(video)
+        and report.get("settings") == settings
+    )
+
+
+def analyze_video(video, json_path, csv_path, settings, shard_workers=None):
+    """Worker: extract (through the landmark cache), score and write reports.
+
+    With ``shard_workers`` the extraction itself is split across that many
+    processes.
+    """
+    start = time.perf_counter()
+    options = {k: settings[k]
+               for k in ("target_fps", "inference_size", "track_roi", "tiered")}
+    stamp = video_stamp(video)
+    extract = partial(extract_motion_sharded, workers=shard_workers or 1)
+    motion = cached_extract_motion(str(video), extract=extract, **options)
+    if motion["frame_count"] == 0:
+        raise ValueError("no frames could be decoded")
+
+    profile = PROFILES[settings["exercise"]]
+    values, frame_index = profile_signal(motion, profile)
+    reps = profile_reps(values, frame_index, motion["fps"], profile,
+                        good_t=settings["good_t"], bad_t=settings["bad_t"],
+                        adaptive=settings["auto_spacing"])
+    summary = summarize_reps(reps)
+    table = pd.DataFrame(reps).drop(columns=["peak", "color"])
+    table.to_csv(csv_path, index=False)
+
+    report = {
+        "version": REPORT_VERSION,
+        "video": str(video),
+        "source": stamp,
+        "settings": settings,
+        "fps": motion["fps"],
+        "frame_count": motion["frame_count"],
+        "summary": summary,
+        "reps": json.loads(table.to_json(orient="records")),
+    }
+    tmp = json_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    # Written last: a report only exists once the CSV next to it is complete.
+    os.replace(tmp, json_path)
+    return summary, time.perf_counter() - start
+
+
+def run_batch(videos, out_dir, settings, workers=None, force=False, log=print):
+    """Analyze ``videos``; returns the aggregate summary DataFrame."""
+    out_dir = Path(out_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    names = report_names(videos)
+
+    rows = {}
+    todo = []
+    for video in videos:
+        json_path = out_dir / f"{names[video]}.json"
+        report = load_report(json_path)
+        row = {"video": str(video), "report": str(json_path)}
+        if not force and is_up_to_date(report, video, settings):
+            rows[video] = {**row, "status": "skipped", **report["summary"]}
+        else:
+            rows[video] = row
+            todo.append((video, json_path, out_dir / f"{names[video]}.csv"))
+    log(f"{len(videos)} videos, {len(todo)} to analyze, "
+        f"{len(videos) - len(todo)} up to date")
+
+    def finished(video, result):
+        try:
+            summary, seconds = result()
+        except Exception as e:  # keep going; report it in the summary
+            rows[video].update({"status": "failed", "error": str(e)})
+            log(f"FAILED {video.name}: {e}")
+            return
+        rows[video].update({"status": "ok", "duration": round(seconds, 1),
+                            **summary})
+        log(f"{video.name}: {summary['total']} reps "
+            f"({summary['good']} good, {summary['risky']} risky) "
+            f"in {seconds:.1f}s")
+
+    workers = workers or os.cpu_count() or 1
+    if len(todo) == 1:
+        # One video: its shards get the workers (see sharded_pipeline).
+        video, json_path, csv_path = todo[0]
+        finished(video, partial(analyze_video, video, json_path, csv_path,
+                                settings, shard_workers=workers))
+    elif todo:
+        # One MediaPipe graph per process; spawn so workers don't inherit
+        # the parent's threads.
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)),
+                                 mp_context=ctx) as ex:
+            futures = {
+                ex.submit(analyze_video, video, json_path, csv_path, settings): video
+                for video, json_path, csv_path in todo
+            }
+            for future in as_completed(futures):
+                finished(futures[future], future.result)
+
+    table = pd.DataFrame([rows[v] for v in videos], columns=SUMMARY_COLUMNS)
+    counts = ["total", "good", "bad", "poor", "risky"]
+    table[counts] = table[counts].astype("Int64")  # failed rows stay empty
+    table.to_csv(out_dir / "summary.csv", index=False)
+    return table
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze workout videos in bulk and write rep reports."
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="video files, directories or glob patterns")
+    parser.add_argument("-o", "--out", default="reports",
+                        help="report directory (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="videos analyzed in parallel, or shards of a single "
+                             "video (default: CPU count)")
+    parser.add_argument("--exercise", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="exercise profile (default: %(default)s)")
+    parser.add_argument("--good-t", type=float, default=None,
+                        help="good rep threshold; default from the profile")
+    parser.add_argument("--bad-t", type=float, default=None,
+                        help="bad rep threshold; default from the profile")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="adaptive sampling target; default every frame")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="downscale frames to this long side before inference")
+    parser.add_argument("--track-roi", action="store_true",
+                        help="crop to the tracked person")
+    parser.add_argument("--tiered", action="store_true",
+                        help="lite pose model, full model only where needed")
+    parser.add_argument("--auto-spacing", action="store_true",
+                        help="derive peak spacing from the rep tempo, skip rests")
+    parser.add_argument("--force", action="store_true",
+                        help="re-analyze videos even if their report is up to date")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No videos found.", file=sys.stderr)
+        return 1
+
+    settings = {
+        "exercise": args.exercise,
+        "good_t": args.good_t,
+        "bad_t": args.bad_t,
+        "auto_spacing": args.auto_spacing,
+        "target_fps": args.target_fps,
+        "inference_size": args.inference_size,
+        "track_roi": args.track_roi,
+        "tiered": args.tiered,
+    }
+    table = run_batch(videos, args.out, settings, args.workers, args.force)
+
+    counts = table["status"].value_counts()
+    print(f"\nDone: {counts.get('ok', 0)} analyzed, "
+          f"{counts.get('skipped', 0)} up to date, "
+          f"{counts.get('failed', 0)} failed. "
+          f"Summary: {Path(args.out) / 'summary.csv'}")
+    return 1 if counts.get("failed", 0) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# CPU only: hide GPUs before anything can initialise a GPU backend.
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from pose_pipeline import (
+    TRACK_POINTS,
+    FramePipeline,
+    create_pose,
+    motion_result,
+    video_fps,
+)
+from rep_analysis import analyze_reps
+
+# Benchmarks ------------------
+# Throughput (items/sec), per-item latency percentiles and peak memory for
+# each stage of the pose pipeline, on recorded clips and synthetic landmark
+# signals. Every (stage, fixture) pair runs in its own fresh process so its
+# peak RSS is not inflated by earlier stages. Results go to a JSON file that
+# can be compared against a run from another commit:
+#
+#   python benchmark.py --out before.json
+#   python benchmark.py --out after.json --compare before.json
+
+BASE_DIR = Path(__file__).resolve().parent
+CLIPS = [BASE_DIR / "input_video.mp4"]
+SYNTHETIC_FRAMES = [1_000, 100_000]
+
+CLIP_STAGES = ["decode", "color", "pose", "pipeline"]
+SIGNAL_STAGES = ["motion", "reps"]
+STAGES = CLIP_STAGES + SIGNAL_STAGES
+
+WARMUP = 10         # pose.process calls before timing starts
+MAX_FRAMES = 300    # frames per clip held in memory for color/pose
+REPEAT = 5          # timed calls for the whole-signal stages
+SYNTHETIC_FPS = 30.0
+
+
+# Fixtures ------------------
+
+def read_frames(clip, max_frames=MAX_FRAMES):
+    cap = cv2.VideoCapture(str(clip))
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    fps = video_fps(cap)
+    cap.release()
+    if not frames:
+        raise ValueError(f"Could not decode {clip}")
+    return frames, fps
+
+
+def synthetic_landmarks(frames, fps=SYNTHETIC_FPS, rep_seconds=2.0, seed=0):
+    """(frames, 33, 4) squat-like track: tracked joints oscillate once per rep.
+
+    About 2% of frames have no detection, like a real recording.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(0.3, 0.7, size=(33, 4)).astype(np.float32)
+    base[:, 3] = 1.0
+    t = np.arange(frames) / fps
+    phase = np.sin(2 * np.pi * t / rep_seconds)
+
+    landmarks = np.repeat(base[None], frames, axis=0)
+    landmarks[:, TRACK_POINTS, 1] += 0.08 * phase[:, None]
+    landmarks[:, :, :3] += rng.normal(0, 0.002, size=(frames, 33, 3))
+    landmarks[rng.random(frames) < 0.02] = np.nan
+    return landmarks
+
+
+# Stages ------------------
+# Each returns (per-item seconds, items, wall seconds).
+
+def _timed(fn, items):
+    times = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - t0)
+    return times, len(times), time.perf_counter() - start
+
+
+def bench_decode(clip, max_frames):
+    cap = cv2.VideoCapture(str(clip))
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_frames:
+        t0 = time.perf_counter()
+        ret, _ = cap.read()
+        if not ret:
+            break
+        times.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - start
+    cap.release()
+    return times, len(times), wall
+
+
+def bench_color(clip, max_frames):
+    frames, _ = read_frames(clip, max_frames)
+    return _timed(lambda f: cv2.cvtColor(f, cv2.COLOR_BGR2RGB), frames)
+
+
+def bench_pose(clip, max_frames):
+    frames, _ = read_frames(clip, max_frames)
+    rgb = [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in frames]
+    with create_pose() as pose:
+        for f in rgb[:WARMUP]:
+            pose.process(f)
+        pose.reset()
+        return _timed(pose.process, rgb)
+
+
+def bench_pipeline(clip, max_frames):
+    """End to end threaded decode + inference; latency is inter-arrival time."""
+    times = []
+    start = prev = time.perf_counter()
+    for _ in FramePipeline(clip, end=max_frames):
+        now = time.perf_counter()
+        times.append(now - prev)
+        prev = now
+    return times, len(times), time.perf_counter() - start
+
+
+def bench_motion(frames, repeat):
+    landmarks = synthetic_landmarks(frames)
+    sampled = np.arange(frames)
+    # motion_result fills gaps in place, so every call gets a fresh copy.
+    times, _, wall = _timed(
+        lambda lms: motion_result(SYNTHETIC_FPS, lms, sampled),
+        (landmarks.copy() for _ in range(repeat)),
+    )
+    return times, frames * repeat, wall
+
+
+def bench_reps(frames, repeat):
+    motion = motion_result(SYNTHETIC_FPS, synthetic_landmarks(frames),
+                           np.arange(frames))
+    values, index = motion["movement_values"], motion["frame_index"]
+    times, _, wall = _timed(
+        lambda _: analyze_reps(values, index, SYNTHETIC_FPS), range(repeat)
+    )
+    return times, len(values) * repeat, wall
+
+
+BENCHES = {
+    "decode": bench_decode,
+    "color": bench_color,
+    "pose": bench_pose,
+    "pipeline": bench_pipeline,
+    "motion": bench_motion,
+    "reps": bench_reps,
+}
+
+
+# Measurement ------------------
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _run(stage, fixture, size):
+    """Worker: one stage on one fixture, in a fresh process."""
+    rss_before = peak_rss_mb()
+    times, items, wall = BENCHES[stage](fixture, size)
+    rss_after = peak_rss_mb()
+
+    busy = sum(times)
+    ms = np.array(times) * 1000
+    return {
+        "items": items,
+        "wall_s": wall,
+        "items_per_s": items / busy if busy else None,
+        "latency_ms": {
+            "mean": float(ms.mean()),
+            "p50": float(np.percentile(ms, 50)),
+            "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)),
+            "max": float(ms.max()),
+        } if len(ms) else None,
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": (rss_after - rss_before) if rss_after is not None else None,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "mediapipe": mp.__version__,
+    }
+
+
+def run_benchmarks(stages=STAGES, clips=CLIPS, synthetic=SYNTHETIC_FRAMES,
+                   max_frames=MAX_FRAMES, repeat=REPEAT, log=print):
+    jobs = []
+    for stage in stages:
+        if stage in CLIP_STAGES:
+            jobs += [(stage, str(c), Path(c).name, max_frames) for c in clips]
+        else:
+            jobs += [(stage, n, f"synthetic-{n}", repeat) for n in synthetic]
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for stage, fixture, name, size in jobs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+            result = ex.submit(_run, stage, fixture, size).result()
+        result = {"stage": stage, "fixture": name, **result}
+        results.append(result)
+        log(format_result(result))
+    return {"environment": environment(), "results": results}
+
+
+# Reporting ------------------
+
+def format_result(r):
+    lat = r["latency_ms"] or {}
+    mem = "" if r["peak_rss_mb"] is None else f"  peak {r['peak_rss_mb']:.0f} MB"
+    return (
+        f"{r['stage']:<9} {r['fixture']:<20} {r['items_per_s']:>12,.0f}/s  "
+        f"p50 {lat.get('p50', 0):8.3f} ms  p99 {lat.get('p99', 0):8.3f} ms{mem}"
+    )
+
+
+def compare(current, baseline, log=print):
+    """Throughput ratio per (stage, fixture); >1 means faster than baseline."""
+    old = {(r["stage"], r["fixture"]): r for r in baseline["results"]}
+    log(f"\nvs {baseline['environment'].get('commit') or 'baseline'}:")
+    for r in current["results"]:
+        b = old.get((r["stage"], r["fixture"]))
+        if not b or not b["items_per_s"] or not r["items_per_s"]:
+            continue
+        ratio = r["items_per_s"] / b["items_per_s"]
+        log(f"{r['stage']:<9} {r['fixture']:<20} {ratio:6.2f}x  "
+            f"({b['items_per_s']:,.0f}/s -> {r['items_per_s']:,.0f}/s)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pose pipeline.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--clips", nargs="+", default=[str(c) for c in CLIPS],
+                        help="video fixtures for the decode/color/pose/pipeline stages")
+    parser.add_argument("--synthetic-frames", nargs="+", type=int,
+                        default=SYNTHETIC_FRAMES,
+                        help="synthetic signal lengths for the motion/reps stages")
+    parser.add_argument("--max-frames", type=int, default=MAX_FRAMES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("-o", "--out", default="benchmark.json")
+    parser.add_argument("--compare", metavar="BASELINE_JSON",
+                        help="print throughput relative to an earlier result file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmarks(args.stages, args.clips, args.synthetic_frames,
+                            args.max_frames, args.repeat)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
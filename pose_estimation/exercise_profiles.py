@@ -0,0 +1,209 @@
+import numpy as np
+
+from landmark_store import LANDMARK_NAMES
+from pose_pipeline import detected_frames, motion_from_track
+from rep_analysis import (
+    BAD_T,
+    GOOD_T,
+    MAX_AMP,
+    PEAK_DISTANCE,
+    PEAK_HEIGHT,
+    SPIKE_T,
+    WINDOW,
+    analyze_reps,
+    detect_reps,
+)
+from rep_period import adaptive_reps
+from stage_timer import NULL_TIMER
+
+# Exercise profiles ------------------
+# Each profile declares the joints it depends on, the joint-angle triplets
+# (a, vertex, c) it measures and the rep thresholds on its own signal
+# scale. Every profile reads the same full-body landmark tensor, so
+# switching exercise re-runs only this numpy code, never MediaPipe.
+#
+# signal "motion":  mean frame-to-frame displacement of ``joints``
+#                   (the original hip/knee/ankle signal).
+# signal "flexion": 180 - angle in degrees, per angle triplet, combined
+#                   with ``combine`` ("mean" or "max"); reps peak at the
+#                   deepest bend.
+
+LANDMARK_INDEX = {name: i for i, name in enumerate(LANDMARK_NAMES)}
+
+KNEES = {
+    "left_knee": ("left_hip", "left_knee", "left_ankle"),
+    "right_knee": ("right_hip", "right_knee", "right_ankle"),
+}
+ELBOWS = {
+    "left_elbow": ("left_shoulder", "left_elbow", "left_wrist"),
+    "right_elbow": ("right_shoulder", "right_elbow", "right_wrist"),
+}
+
+PROFILES = {
+    "general": {
+        "label": "General (joint movement)",
+        "joints": ["right_hip", "right_knee", "right_ankle"],
+        "angles": {},
+        "signal": "motion",
+        "signal_label": "Avg Joint Movement",
+        "thresholds": {
+            "peak_height": PEAK_HEIGHT, "peak_distance": PEAK_DISTANCE,
+            "peak_prominence": None,
+            "good_t": GOOD_T, "bad_t": BAD_T, "window": WINDOW,
+            "max_amp": MAX_AMP, "spike_t": SPIKE_T,
+        },
+        "good_range": (0.015, 0.03),
+        "bad_range": (0.008, 0.02),
+        "plot_max": 0.06,
+    },
+    "squat": {
+        "label": "Squat",
+        "joints": ["left_hip", "right_hip", "left_knee", "right_knee",
+                   "left_ankle", "right_ankle"],
+        "angles": KNEES,
+        "signal": "flexion",
+        "combine": "mean",
+        "signal_label": "Knee Flexion (°)",
+        "thresholds": {
+            "peak_height": 40.0, "peak_distance": 24, "peak_prominence": 30.0,
+            "good_t": 70.0, "bad_t": 45.0, "window": 30,
+            "max_amp": 100.0, "spike_t": 140.0,
+        },
+        "good_range": (50.0, 100.0),
+        "bad_range": (20.0, 70.0),
+        "plot_max": 150.0,
+    },
+    "lunge": {
+        "label": "Lunge",
+        "joints": ["left_hip", "right_hip", "left_knee", "right_knee",
+                   "left_ankle", "right_ankle"],
+        "angles": KNEES,
+        "signal": "flexion",
+        "combine": "max",   # the front knee bends most
+        "signal_label": "Front Knee Flexion (°)",
+        "thresholds": {
+            "peak_height": 40.0, "peak_distance": 24, "peak_prominence": 30.0,
+            "good_t": 70.0, "bad_t": 45.0, "window": 30,
+            "max_amp": 100.0, "spike_t": 140.0,
+        },
+        "good_range": (50.0, 100.0),
+        "bad_range": (20.0, 70.0),
+        "plot_max": 150.0,
+    },
+    "pushup": {
+        "label": "Push-up",
+        "joints": ["left_shoulder", "right_shoulder", "left_elbow",
+                   "right_elbow", "left_wrist", "right_wrist"],
+        "angles": ELBOWS,
+        "signal": "flexion",
+        "combine": "mean",
+        "signal_label": "Elbow Flexion (°)",
+        "thresholds": {
+            "peak_height": 40.0, "peak_distance": 20, "peak_prominence": 30.0,
+            "good_t": 70.0, "bad_t": 45.0, "window": 24,
+            "max_amp": 100.0, "spike_t": 140.0,
+        },
+        "good_range": (50.0, 100.0),
+        "bad_range": (20.0, 70.0),
+        "plot_max": 150.0,
+    },
+    "curl": {
+        "label": "Bicep Curl",
+        "joints": ["left_shoulder", "right_shoulder", "left_elbow",
+                   "right_elbow", "left_wrist", "right_wrist"],
+        "angles": ELBOWS,
+        "signal": "flexion",
+        "combine": "max",   # works for single-arm and alternating curls
+        "signal_label": "Elbow Flexion (°)",
+        "thresholds": {
+            "peak_height": 80.0, "peak_distance": 20, "peak_prominence": 40.0,
+            "good_t": 110.0, "bad_t": 80.0, "window": 24,
+            "max_amp": 140.0, "spike_t": 175.0,
+        },
+        "good_range": (80.0, 140.0),
+        "bad_range": (40.0, 110.0),
+        "plot_max": 180.0,
+    },
+}
+
+DEFAULT_PROFILE = "general"
+
+
+def joint_angles(landmarks, triplets, aspect=1.0):
+    """Angle in degrees at the middle joint of every triplet, for all frames.
+
+    ``landmarks`` is (frames, 33, >=2); returns (frames, len(triplets)),
+    NaN where a frame has no detection. x is scaled by ``aspect``
+    (width / height) because normalized coordinates stretch the shorter
+    image axis.
+    """
+    idx = np.array([[LANDMARK_INDEX[j] for j in t] for t in triplets],
+                   dtype=np.intp).reshape(-1, 3)
+    pts = np.asarray(landmarks)[:, idx, :2].astype(np.float64)
+    pts[..., 0] *= aspect
+
+    ba = pts[:, :, 0] - pts[:, :, 1]
+    bc = pts[:, :, 2] - pts[:, :, 1]
+    cos = np.einsum("fkc,fkc->fk", ba, bc) / (
+        np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    )
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+def frame_aspect(motion):
+    width, height = motion.get("frame_size", (0, 0))
+    return width / height if width and height else 1.0
+
+
+def profile_signal(motion, profile):
+    """``(values, frame_index)`` for ``profile`` from an ``extract_motion`` result."""
+    landmarks = motion["landmarks"]
+    frames = detected_frames(landmarks)
+
+    if profile["signal"] == "motion":
+        idx = [LANDMARK_INDEX[j] for j in profile["joints"]]
+        points = landmarks[frames][:, idx, :2].astype(np.float64)
+        return motion_from_track(frames, points)
+
+    flexion = 180.0 - joint_angles(landmarks[frames],
+                                   list(profile["angles"].values()),
+                                   frame_aspect(motion))
+    combine = np.max if profile["combine"] == "max" else np.mean
+    return combine(flexion, axis=1), frames.tolist()
+
+
+def sample_rate(frame_index, fps):
+    """Signal samples per second (frames may be skipped between samples)."""
+    step = np.median(np.diff(frame_index)) if len(frame_index) > 1 else 1
+    return fps / max(step, 1)
+
+
+def profile_reps(values, frame_index, fps, profile, good_t=None, bad_t=None,
+                 adaptive=False, timer=NULL_TIMER):
+    """``analyze_reps`` with the profile's thresholds (good/bad overridable).
+
+    With ``adaptive`` the peak spacing and height follow the measured rep
+    period (see ``rep_period``), rest periods are skipped and the result
+    gets a ``period`` column (seconds, NaN where the fixed thresholds were
+    used).
+    """
+    t = profile["thresholds"]
+    with timer.stage("find_peaks"):
+        if adaptive:
+            rate = sample_rate(frame_index, fps)
+            peaks, periods, _ = adaptive_reps(values, rate, t["peak_height"],
+                                              t["peak_distance"],
+                                              t["peak_prominence"])
+        else:
+            peaks = detect_reps(values, t["peak_height"], t["peak_distance"],
+                                t["peak_prominence"])
+    with timer.stage("rep_scoring"):
+        reps = analyze_reps(
+            values, frame_index, fps, peaks=peaks,
+            good_t=t["good_t"] if good_t is None else good_t,
+            bad_t=t["bad_t"] if bad_t is None else bad_t,
+            window=t["window"], max_amp=t["max_amp"], spike_t=t["spike_t"],
+        )
+    if adaptive:
+        reps["period"] = np.round(periods / rate, 2)
+    return reps
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from pose_pipeline import POSE_SETTINGS, extract_motion
+
+# Landmark cache ------------------
+# Extraction results are stored on disk as .npz, keyed by the video content
+# hash plus every setting that changes MediaPipe's output. Threshold sliders
+# and reruns then only re-run rep analysis on the cached signal. The oldest
+# entries (by last use) are evicted once the cache grows past its size limit.
+
+CACHE_DIR = Path(os.environ.get(
+    "POSE_CACHE_DIR", Path.home() / ".cache" / "pose_estimation" / "landmarks"
+))
+MAX_CACHE_BYTES = int(os.environ.get("POSE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Bump when the stored layout or the extraction math changes.
+CACHE_VERSION = 3
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _canonical_options(options):
+    """``options`` without unset entries, so ``{}`` and ``{"tiered": False}``
+    (every extraction option defaults to None or False) share a key."""
+    return {k: v for k, v in options.items() if v is not None and v is not False}
+
+
+def cache_key(digest, options):
+    settings = {
+        "version": CACHE_VERSION,
+        "pose": POSE_SETTINGS,
+        "options": _canonical_options(options),
+    }
+    blob = digest + json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _path(key):
+    return CACHE_DIR / f"{key}.npz"
+
+
+def load_motion(digest, options):
+    """Cached ``extract_motion`` result, or None on a miss."""
+    path = _path(cache_key(digest, options))
+    try:
+        with np.load(path) as data:
+            motion = {k: data[k] for k in data.files}
+    except (OSError, ValueError):
+        return None
+
+    os.utime(path)  # mark as recently used for LRU eviction
+    for k in ("fps", "inference_fps"):
+        motion[k] = float(motion[k])
+    for k in ("frame_count", "inferred_frames", "lite_frames", "full_frames"):
+        if k in motion:
+            motion[k] = int(motion[k])
+    motion["frame_index"] = motion["frame_index"].tolist()
+    return motion
+
+
+def save_motion(digest, options, motion, max_bytes=MAX_CACHE_BYTES):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _path(cache_key(digest, options))
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **motion)
+    os.replace(tmp, path)  # readers never see a half-written entry
+    evict(max_bytes, keep=path)
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, keep=None):
+    """Delete least recently used entries until the cache fits ``max_bytes``.
+
+    ``keep`` (the entry just saved) is never deleted, even if it alone is
+    larger than ``max_bytes``.
+    """
+    entries = []
+    for p in CACHE_DIR.glob("*.npz"):
+        if p == keep:
+            continue
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+
+    total = sum(size for _, size, _ in entries)
+    if keep is not None:
+        try:
+            total += keep.stat().st_size
+        except OSError:
+            pass
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            p.unlink()
+        except OSError:
+            continue
+        total -= size
+
+
+def cached_extract_motion(video_path, extract=extract_motion, digest=None,
+                          **options):
+    """``extract(video_path, **options)`` backed by the on-disk cache."""
+    digest = digest or file_digest(video_path)
+    motion = load_motion(digest, options)
+    if motion is None:
+        motion = extract(video_path, **options)
+        save_motion(digest, options, motion)
+    return motion
@@ -0,0 +1,119 @@
+import io
+import os
+import tempfile
+import weakref
+
+import mediapipe as mp
+import numpy as np
+import pandas as pd
+
+# Full-body landmark storage ------------------
+# Every frame's 33 landmarks (x, y, z, visibility) go into one preallocated
+# float32 array indexed by frame number; frames without a detection stay
+# NaN. Long videos spill to a memory-mapped .npy so resident memory stays
+# small, and the tensor can be exported for later analysis of other joints.
+
+LANDMARK_NAMES = [lm.name.lower() for lm in mp.solutions.pose.PoseLandmark]
+CHANNELS = ["x", "y", "z", "visibility"]
+FRAME_SHAPE = (len(LANDMARK_NAMES), len(CHANNELS))
+
+# Above this size the buffer lives in a memory-mapped temp file.
+SPILL_BYTES = int(os.environ.get("POSE_LANDMARK_SPILL_BYTES", 256 * 1024 * 1024))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def allocate_landmarks(frames, spill_bytes=SPILL_BYTES):
+    """NaN-filled (frames, 33, 4) float32 array, memory-mapped when large."""
+    shape = (frames, *FRAME_SHAPE)
+    nbytes = int(np.prod(shape)) * 4
+    if nbytes <= spill_bytes:
+        return np.full(shape, np.nan, dtype=np.float32)
+
+    fd, path = tempfile.mkstemp(prefix="pose_landmarks_", suffix=".npy")
+    os.close(fd)
+    arr = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+    arr[:] = np.nan
+    try:
+        os.remove(path)  # POSIX: the mapping keeps the data alive
+    except OSError:
+        weakref.finalize(arr, _remove, path)
+    return arr
+
+
+class LandmarkBuffer:
+    """Growable per-frame landmark tensor.
+
+    Sized from the container's frame count up front; grows (doubling) only
+    if the video turns out longer than reported.
+    """
+
+    def __init__(self, frames, spill_bytes=SPILL_BYTES):
+        self.spill_bytes = spill_bytes
+        self.data = allocate_landmarks(max(1, frames), spill_bytes)
+        self.size = 0
+
+    def _reserve(self, frames):
+        if frames <= len(self.data):
+            return
+        grown = allocate_landmarks(max(frames, 2 * len(self.data)), self.spill_bytes)
+        grown[:len(self.data)] = self.data
+        self.data = grown
+
+    def put(self, index, lms):
+        self._reserve(index + 1)
+        self.data[index] = lms
+        self.size = max(self.size, index + 1)
+
+    def write(self, start, block):
+        """Copy a (n, 33, 4) block of consecutive frames starting at ``start``."""
+        self._reserve(start + len(block))
+        self.data[start:start + len(block)] = block
+        self.size = max(self.size, start + len(block))
+
+    def finish(self, frames=None):
+        frames = self.size if frames is None else frames
+        self._reserve(frames)
+        return self.data[:frames]
+
+
+def landmarks_frame(landmarks, fps):
+    """Wide DataFrame: frame, time and one column per landmark channel."""
+    frames = len(landmarks)
+    columns = [f"{name}_{c}" for name in LANDMARK_NAMES for c in CHANNELS]
+    df = pd.DataFrame(np.asarray(landmarks).reshape(frames, -1), columns=columns)
+    df.insert(0, "time", np.arange(frames) / fps)
+    df.insert(0, "frame", np.arange(frames))
+    return df
+
+
+def export_npz(file, landmarks, fps):
+    np.savez_compressed(
+        file,
+        landmarks=landmarks,
+        fps=fps,
+        landmark_names=np.array(LANDMARK_NAMES),
+        channels=np.array(CHANNELS),
+    )
+
+
+def export_parquet(file, landmarks, fps):
+    """Needs pyarrow (or fastparquet); raises ImportError otherwise."""
+    landmarks_frame(landmarks, fps).to_parquet(file, index=False)
+
+
+def npz_bytes(landmarks, fps):
+    buf = io.BytesIO()
+    export_npz(buf, landmarks, fps)
+    return buf.getvalue()
+
+
+def parquet_bytes(landmarks, fps):
+    buf = io.BytesIO()
+    export_parquet(buf, landmarks, fps)
+    return buf.getvalue()
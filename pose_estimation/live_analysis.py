@@ -0,0 +1,320 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from pose_pipeline import TRACK_POINTS, checkout_pose, landmarks_to_array, video_fps
+from rep_analysis import (
+    BAD_T,
+    GOOD_T,
+    PEAK_DISTANCE,
+    PEAK_HEIGHT,
+    WINDOW,
+    score_reps,
+)
+
+# Live mode ------------------
+# Reads a camera (or a video file replayed at real-time speed as a stand-in
+# camera), runs pose tracking on the newest frame only, and counts reps
+# online. Frames older than the latency budget are dropped instead of being
+# queued, so the display never falls further behind than the budget.
+
+LATENCY_BUDGET = 0.25   # seconds between capture and result
+
+
+class OnlinePeakDetector:
+    """Incremental ``find_peaks(x, height=height, distance=distance)``.
+
+    ``push`` returns the peaks that can no longer change, in order. A peak
+    is final once no later sample can start a peak within ``distance`` of
+    it (distance selection is greedy by height, so a whole run of close
+    candidates is resolved together). After ``flush`` the peaks returned
+    equal ``find_peaks`` on the full signal; the one exception is peaks of
+    exactly equal height closer than ``distance``, where scipy's tie order
+    comes from an unstable sort over the whole signal.
+    """
+
+    def __init__(self, height=PEAK_HEIGHT, distance=PEAK_DISTANCE):
+        self.height = height
+        self.distance = int(np.ceil(distance))
+        self.n = 0
+        self._prev = None
+        self._plateau = None    # (start index, value) of a rising edge
+        self._pending = []      # [(index, value)] candidates awaiting distance selection
+
+    def earliest(self):
+        """Lowest sample index a future peak can still refer to."""
+        candidates = [self.n]
+        if self._plateau:
+            candidates.append(self._plateau[0])
+        if self._pending:
+            candidates.append(self._pending[0][0])
+        return min(candidates)
+
+    def push(self, value):
+        i = self.n
+        self.n += 1
+
+        found = None
+        if self._plateau is not None:
+            start, top = self._plateau
+            if value < top:
+                # Plateaus report their middle sample, like scipy.
+                found = ((start + i - 1) // 2, top)
+                self._plateau = None
+            elif value > top:
+                self._plateau = (i, value)
+        elif self._prev is not None and self._prev < value:
+            self._plateau = (i, value)
+        self._prev = value
+
+        out = []
+        if found and found[1] >= self.height:
+            if self._pending and found[0] - self._pending[-1][0] >= self.distance:
+                out += self._resolve()
+            self._pending.append(found)
+
+        next_peak = self._plateau[0] if self._plateau else i + 1
+        if self._pending and next_peak - self._pending[-1][0] >= self.distance:
+            out += self._resolve()
+        return out
+
+    def flush(self):
+        # A plateau still open at the end of the signal is not a peak.
+        self._plateau = None
+        return self._resolve() if self._pending else []
+
+    def _resolve(self):
+        pending, self._pending = self._pending, []
+        index = np.array([p for p, _ in pending])
+        keep = np.ones(len(pending), dtype=bool)
+        # Highest first; same tie order as scipy's _select_by_peak_distance.
+        for j in np.argsort([h for _, h in pending])[::-1]:
+            if keep[j]:
+                near = np.abs(index - index[j]) < self.distance
+                near[j] = False
+                keep &= ~near
+        return [pending[j] for j in np.flatnonzero(keep)]
+
+
+class LiveRepCounter:
+    """Feed motion values one at a time; get scored reps as they finish.
+
+    A rep is reported once its peak is final and the ``window`` samples
+    after it have arrived, so its depth matches ``analyze_reps``.
+    """
+
+    def __init__(self, fps, good_t=GOOD_T, bad_t=BAD_T, window=WINDOW):
+        self.fps = fps
+        self.good_t = good_t
+        self.bad_t = bad_t
+        self.window = window
+        self.detector = OnlinePeakDetector()
+        self.values = []
+        self.frames = []
+        self.offset = 0         # sample index of values[0]
+        self.waiting = []       # final peaks whose window isn't complete yet
+        self.reps = []
+        self._prev_good = False
+
+    def push(self, value, frame_no):
+        self.values.append(value)
+        self.frames.append(frame_no)
+        self.waiting += self.detector.push(value)
+        return self._emit(final=False)
+
+    def finish(self):
+        self.waiting += self.detector.flush()
+        return self._emit(final=True)
+
+    def _emit(self, final):
+        n = self.offset + len(self.values)
+        new = []
+        while self.waiting and (final or self.waiting[0][0] + self.window <= n):
+            peak, value = self.waiting.pop(0)
+            lo = max(0, peak - self.window) - self.offset
+            hi = min(n, peak + self.window) - self.offset
+            seg = self.values[lo:hi]
+            scored = score_reps([max(seg) - min(seg)], self.good_t, self.bad_t,
+                                prev_good=self._prev_good)
+            frame = self.frames[peak - self.offset]
+            rep = {k: v[0] for k, v in scored.items()}
+            rep.update({
+                "rep": len(self.reps) + 1,
+                "frame": frame,
+                "time": round(frame / self.fps, 2),
+                "value": value,
+            })
+            self._prev_good = rep["status"] == "GOOD"
+            self.reps.append(rep)
+            new.append(rep)
+
+        # Drop samples no future rep window can reach.
+        keep_from = min([p for p, _ in self.waiting] + [self.detector.earliest()])
+        cut = keep_from - self.window - self.offset
+        if cut > 1024:
+            del self.values[:cut]
+            del self.frames[:cut]
+            self.offset += cut
+        return new
+
+
+class _LatestFrame:
+    """Single-slot buffer: a new frame overwrites one nobody has taken yet.
+
+    With ``block`` the producer waits for the slot instead (no dropping).
+    """
+
+    def __init__(self, block=False):
+        self.cond = threading.Condition()
+        self.block = block
+        self.item = None
+        self.done = False
+        self.overwritten = 0
+
+    def put(self, item, stop):
+        with self.cond:
+            while self.block and self.item is not None and not stop.is_set():
+                self.cond.wait(0.1)
+            if self.item is not None:
+                self.overwritten += 1
+            self.item = item
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+    def take_overwritten(self):
+        with self.cond:
+            n, self.overwritten = self.overwritten, 0
+            return n
+
+    def take(self, timeout=0.5):
+        with self.cond:
+            while self.item is None and not self.done:
+                if not self.cond.wait(timeout):
+                    return None
+            item, self.item = self.item, None
+            self.cond.notify_all()
+            return item
+
+
+class LiveSession:
+    """Live pose tracking with online rep counting.
+
+    ``source`` is a camera index or a video path; files are replayed at
+    their own frame rate when ``realtime`` is set. Frames that would be
+    processed more than ``latency_budget`` seconds after capture are
+    dropped (``None`` disables dropping). Iterating yields a state dict
+    after each processed frame; ``stop()`` ends the session.
+    """
+
+    def __init__(self, source, latency_budget=LATENCY_BUDGET, realtime=True,
+                 pose=None, good_t=GOOD_T, bad_t=BAD_T):
+        self.source = source
+        self.latency_budget = latency_budget
+        self.realtime = realtime and not isinstance(source, int)
+        self.pose = pose
+        self.good_t = good_t
+        self.bad_t = bad_t
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _capture(self, cap, fps, slot):
+        try:
+            start = time.monotonic()
+            frame_no = 0
+            while not self._stop.is_set():
+                if self.realtime:
+                    delay = start + frame_no / fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                slot.put((frame_no, frame, time.monotonic()), self._stop)
+                frame_no += 1
+        finally:
+            cap.release()
+            slot.close()
+
+    def __iter__(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open video source {self.source!r}")
+        with nullcontext(self.pose) if self.pose else checkout_pose() as pose:
+            yield from self._run(cap, pose)
+
+    def _run(self, cap, pose):
+        fps = video_fps(cap)
+        counter = LiveRepCounter(fps, self.good_t, self.bad_t)
+        # Without a latency budget every frame is processed, however late.
+        slot = _LatestFrame(block=self.latency_budget is None)
+
+        capture = threading.Thread(target=self._capture, args=(cap, fps, slot),
+                                   daemon=True)
+        capture.start()
+
+        state = {
+            "fps": fps,
+            "frame_no": -1,
+            "frame": None,
+            "landmarks": None,
+            "reps": counter.reps,
+            "new_reps": [],
+            "processed": 0,
+            "dropped": 0,
+            "latency": 0.0,
+            "max_latency": 0.0,
+            "done": False,
+        }
+        prev_points = None
+        try:
+            while not self._stop.is_set():
+                item = slot.take()
+                if item is None:
+                    if slot.done:
+                        break
+                    continue
+
+                frame_no, frame, captured = item
+                if (self.latency_budget is not None
+                        and time.monotonic() - captured > self.latency_budget):
+                    state["dropped"] += 1
+                    continue
+
+                result = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                lms = None
+                new_reps = []
+                if result.pose_landmarks:
+                    lms = landmarks_to_array(result.pose_landmarks)
+                    curr_points = lms[TRACK_POINTS, :2].astype(np.float64)
+                    if prev_points is not None:
+                        diffs = np.linalg.norm(curr_points - prev_points, axis=1)
+                        new_reps = counter.push(np.mean(diffs), frame_no)
+                    prev_points = curr_points
+
+                latency = time.monotonic() - captured
+                state.update({
+                    "frame_no": frame_no,
+                    "frame": frame,
+                    "landmarks": lms,
+                    "new_reps": new_reps,
+                    "processed": state["processed"] + 1,
+                    "dropped": state["dropped"] + slot.take_overwritten(),
+                    "latency": latency,
+                    "max_latency": max(state["max_latency"], latency),
+                })
+                yield state
+
+            state.update({"new_reps": counter.finish(), "done": True})
+            yield state
+        finally:
+            self._stop.set()
+            capture.join()
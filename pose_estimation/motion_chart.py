@@ -0,0 +1,52 @@
+import numpy as np
+
+from rep_analysis import STATUS_COLORS
+
+# Motion chart ------------------
+# Long sessions have far more samples than the chart has pixels. The signal
+# is reduced to the min and max of each pixel-wide bucket (so spikes and
+# dips survive), rep peaks are always kept, and rep markers are drawn with
+# one scatter call per status instead of one per rep.
+
+POINTS_PER_PIXEL = 2  # a bucket's min and max
+
+
+def minmax_indices(values, buckets, keep=()):
+    """Sorted indices of the min and max of ``buckets`` equal slices of
+    ``values``, plus the first/last sample and every index in ``keep``."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= 2 * buckets:
+        return np.arange(n)
+
+    size = -(-n // buckets)  # ceil
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    rows = padded.reshape(buckets, size)
+    # Only the last row can be partly padding and it always has one real value;
+    # all-NaN rows appear only if the signal itself has NaN gaps.
+    valid = ~np.isnan(rows).all(axis=1)
+    offsets = np.arange(buckets)[valid] * size
+    lo = offsets + np.nanargmin(rows[valid], axis=1)
+    hi = offsets + np.nanargmax(rows[valid], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lo, hi, np.asarray(keep, dtype=np.intp)]))
+
+
+def plot_signal(ax, frame_index, values, keep=(), **kwargs):
+    """``ax.plot`` of the signal, downsampled to the axes' pixel width."""
+    values = np.asarray(values)
+    buckets = max(1, int(ax.get_window_extent().width) * POINTS_PER_PIXEL // 2)
+    idx = minmax_indices(values, buckets, keep)
+    return ax.plot(np.asarray(frame_index)[idx], values[idx], **kwargs)
+
+
+def plot_reps(ax, reps, labels=None, **kwargs):
+    """One scatter per rep status; ``labels`` maps status to a legend label."""
+    for status, color in STATUS_COLORS.items():
+        mask = reps["status"] == status
+        if labels is None and not mask.any():
+            continue
+        ax.scatter(
+            reps["frame"][mask], reps["value"][mask], color=color,
+            edgecolors="black", label=labels and labels[status], **kwargs
+        )
@@ -0,0 +1,195 @@
+import numpy as np
+
+from exercise_profiles import profile_reps, profile_signal
+
+# Reference comparison ------------------
+# An athlete's reps are compared with a coach's reference recording of the
+# same exercise. Both profile signals are resampled onto one time grid and
+# cut into reps (valley to valley around every peak); each athlete rep is
+# then matched to its nearest reference rep by dynamic time warping.
+#
+# DTW runs inside a Sakoe-Chiba band around the length-scaled diagonal, so
+# time and memory are O(n * band) instead of O(n * m). Each row of the cost
+# matrix is computed in one go: the in-row dependency
+# D[i, j] = min(x[j], D[i, j - 1] + c[j]) is a minimum.accumulate over
+# x - cumsum(c). The nearest-rep search abandons a candidate as soon as a
+# whole row already costs more than the best match so far.
+
+COMPARE_FPS = 30.0
+BAND_FRACTION = 0.1  # band radius as a fraction of the longer series
+MIN_BAND = 3
+
+
+def resample(values, frame_index, fps, rate=COMPARE_FPS):
+    """``values`` (sampled at ``frame_index``) on a uniform ``rate`` Hz grid.
+
+    Returns ``(grid_values, grid_times)``; gaps are linearly interpolated.
+    """
+    t = np.asarray(frame_index, dtype=np.float64) / fps
+    if len(t) == 0:
+        return np.zeros(0), np.zeros(0)
+    grid = np.arange(t[0], t[-1] + 0.5 / rate, 1.0 / rate)
+    return np.interp(grid, t, np.asarray(values, dtype=np.float64)), grid
+
+
+def rep_segments(values, peaks, half):
+    """``(starts, ends)`` of every rep: from the valley before its peak to
+    the valley after it. The outer reps extend ``half`` samples (or to the
+    series end) on their open side."""
+    values = np.asarray(values, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.intp)
+    if len(peaks) == 0:
+        return peaks, peaks
+    valleys = np.array(
+        [a + int(np.argmin(values[a:b + 1])) for a, b in zip(peaks[:-1], peaks[1:])],
+        dtype=np.intp,
+    )
+    starts = np.concatenate([[max(0, peaks[0] - half)], valleys])
+    ends = np.concatenate([valleys, [min(len(values) - 1, peaks[-1] + half)]])
+    return starts, ends + 1
+
+
+def _band(n, m, radius):
+    """Column range ``[lo[i], hi[i])`` of row ``i`` of the band."""
+    centre = np.round(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(np.intp)
+    # Consecutive rows must overlap, or the band has no path through it.
+    radius = max(radius, -(-m // max(n, 1)))
+    lo = np.clip(centre - radius, 0, m - 1)
+    hi = np.clip(centre + radius + 1, 1, m)
+    return lo, hi
+
+
+def band_radius(n, m, fraction=BAND_FRACTION):
+    return max(MIN_BAND, int(fraction * max(n, m)))
+
+
+def _rows(a, b, radius):
+    """Yield ``(lo, row)`` for every row of the banded cumulative cost."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    lo, hi = _band(len(a), len(b), radius)
+
+    prev_lo, prev = 0, None
+    for i in range(len(a)):
+        l, h = lo[i], hi[i]
+        cost = np.abs(a[i] - b[l:h])
+        if prev is None:
+            row = np.cumsum(cost)  # row 0 only moves right from (0, 0)
+        else:
+            # up = D[i-1, j], diag = D[i-1, j-1]; inf outside the previous row
+            up = np.full(h - l, np.inf)
+            diag = np.full(h - l, np.inf)
+            s, e = max(l, prev_lo), min(h, prev_lo + len(prev))
+            up[s - l:e - l] = prev[s - prev_lo:e - prev_lo]
+            s, e = max(l, prev_lo + 1), min(h, prev_lo + len(prev) + 1)
+            diag[s - l:e - l] = prev[s - prev_lo - 1:e - prev_lo - 1]
+            x = cost + np.minimum(up, diag)
+            c = np.cumsum(cost)
+            row = np.minimum.accumulate(x - c) + c
+        yield l, row
+        prev_lo, prev = l, row
+
+
+def dtw_distance(a, b, radius=None, abandon=np.inf):
+    """Banded DTW cost (sum of ``|a_i - b_j|`` along the best path).
+
+    Returns ``inf`` as soon as it is certain to exceed ``abandon``.
+    """
+    radius = band_radius(len(a), len(b)) if radius is None else radius
+    row = None
+    for _, row in _rows(a, b, radius):
+        if row.min() > abandon:
+            return np.inf
+    return float(row[-1]) if row is not None else np.inf
+
+
+def dtw_path(a, b, radius=None):
+    """``(cost, path)``: banded DTW with the warping path as (k, 2) indices."""
+    radius = band_radius(len(a), len(b)) if radius is None else radius
+    rows = list(_rows(a, b, radius))
+
+    def at(i, j):
+        l, row = rows[i]
+        return row[j - l] if i >= 0 and l <= j < l + len(row) else np.inf
+
+    i, j = len(a) - 1, len(b) - 1
+    path = [(i, j)]
+    while i or j:
+        steps = [(i - 1, j - 1), (i - 1, j), (i, j - 1)]
+        i, j = min(steps, key=lambda s: at(*s) if min(s) >= 0 else np.inf)
+        path.append((i, j))
+    return float(at(len(a) - 1, len(b) - 1)), np.array(path[::-1], dtype=np.intp)
+
+
+def _session_reps(motion, profile, rate):
+    values, frame_index = profile_signal(motion, profile)
+    grid, times = resample(values, frame_index, motion["fps"], rate)
+    reps = profile_reps(values, frame_index, motion["fps"], profile)
+    peak_t = np.asarray(reps["frame"], dtype=np.float64) / motion["fps"]
+    t0 = times[0] if len(times) else 0.0
+    peaks = np.minimum(np.round((peak_t - t0) * rate).astype(np.intp), len(grid) - 1)
+    half = int(round(profile["thresholds"]["window"] * rate / motion["fps"]))
+    return grid, reps, peaks, rep_segments(grid, peaks, half)
+
+
+def compare_reps(motion, reference, profile, rate=COMPARE_FPS):
+    """Match every rep of ``motion`` to its nearest rep of ``reference``.
+
+    Both are ``extract_motion`` results of the same exercise, compared on
+    ``profile``'s signal. Columnar result (``pd.DataFrame`` ready), one
+    row per athlete rep:
+
+    deviation   mean ``|athlete - reference|`` along the DTW path, in
+                signal units (e.g. degrees of flexion)
+    peak_diff   athlete peak minus reference peak
+    duration / ref_duration, tempo_ratio (athlete / reference)
+    down_diff / up_diff   seconds slower (+) or faster (-) before and
+                after the peak than the reference rep
+    """
+    grid, reps, peaks, (starts, ends) = _session_reps(motion, profile, rate)
+    ref_grid, ref_reps, ref_peaks, (ref_starts, ref_ends) = _session_reps(
+        reference, profile, rate)
+    ref_segs = [ref_grid[s:e] for s, e in zip(ref_starts, ref_ends)]
+
+    n = len(peaks)
+    out = {
+        "rep": reps["rep"],
+        "time": reps["time"],
+        "ref_rep": np.zeros(n, dtype=np.int64),
+        "deviation": np.full(n, np.nan),
+        "peak_diff": np.full(n, np.nan),
+        "duration": (ends - starts) / rate,
+        "ref_duration": np.full(n, np.nan),
+        "tempo_ratio": np.full(n, np.nan),
+        "down_diff": np.full(n, np.nan),
+        "up_diff": np.full(n, np.nan),
+    }
+    if not ref_segs:
+        return out
+
+    for k, (s, e) in enumerate(zip(starts, ends)):
+        seg = grid[s:e]
+        # Similar lengths first: they tend to be close, which tightens the
+        # abandon threshold early.
+        order = np.argsort(np.abs(np.array([len(r) for r in ref_segs]) - len(seg)))
+        best, best_r = np.inf, -1
+        for r in order:
+            norm = len(seg) + len(ref_segs[r])
+            d = dtw_distance(seg, ref_segs[r], abandon=best * norm)
+            if d / norm < best:
+                best, best_r = d / norm, r
+        if best_r < 0:
+            continue
+
+        ref_seg = ref_segs[best_r]
+        cost, path = dtw_path(seg, ref_seg)
+        down = (peaks[k] - s) - (ref_peaks[best_r] - ref_starts[best_r])
+        up = (e - peaks[k]) - (ref_ends[best_r] - ref_peaks[best_r])
+        out["ref_rep"][k] = best_r + 1
+        out["deviation"][k] = cost / len(path)
+        out["peak_diff"][k] = grid[peaks[k]] - ref_grid[ref_peaks[best_r]]
+        out["ref_duration"][k] = len(ref_seg) / rate
+        out["tempo_ratio"][k] = len(seg) / len(ref_seg)
+        out["down_diff"][k] = down / rate
+        out["up_diff"][k] = up / rate
+    return out
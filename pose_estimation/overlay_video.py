@@ -0,0 +1,239 @@
+import bisect
+import collections
+import os
+import queue
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from live_analysis import LiveRepCounter
+from pose_pipeline import _DONE, QUEUE_SIZE, TRACK_POINTS, _get, _put, mp_pose
+from rep_analysis import BAD_T, GOOD_T, PEAK_DISTANCE, WINDOW
+
+# Annotated overlay video ------------------
+# A writer thread draws the pose skeleton, the rep count and each rep's
+# GOOD/BAD/POOR color onto frames handed over by the analysis pass, and
+# encodes them. Reps are counted online (LiveRepCounter on the general
+# movement signal), so frames wait in a short lookback buffer until the
+# reps around them are final; nothing is decoded twice. The finished video
+# stays on disk for the session (see ``SessionOverlay``) and downloads are
+# read from there.
+
+VIDEO_CODEC = "mp4v"    # always available in opencv-python wheels
+MIN_VISIBILITY = 0.5    # skeleton segments below this are not drawn
+
+# A rep is final PEAK_DISTANCE + WINDOW samples after its peak at the
+# latest; keep a margin for frames without a detection.
+LOOKBACK = 2 * (PEAK_DISTANCE + WINDOW)
+
+# BGR
+STATUS_BGR = {"GOOD": (0, 170, 0), "BAD": (0, 140, 255), "POOR": (0, 0, 230)}
+NEUTRAL_BGR = (235, 235, 235)
+
+CONNECTIONS = np.array(sorted(mp_pose.POSE_CONNECTIONS), dtype=np.intp)
+
+
+def output_size(frame_size, height=None):
+    """(width, height) scaled to ``height`` (even numbers, for the encoder)."""
+    width, src_height = frame_size
+    if not height or height >= src_height:
+        height = src_height
+    width = int(round(width * height / src_height))
+    return width - width % 2, int(height) - int(height) % 2
+
+
+def draw_skeleton(image, lms, color):
+    if lms is None:
+        return
+    h, w = image.shape[:2]
+    pts = np.round(lms[:, :2] * (w, h)).astype(np.int32)
+    visible = lms[:, 3] >= MIN_VISIBILITY
+    segs = CONNECTIONS[visible[CONNECTIONS].all(axis=1)]
+    cv2.polylines(image, list(pts[segs]), False, color, 2, cv2.LINE_AA)
+    for p in pts[TRACK_POINTS][visible[TRACK_POINTS]]:
+        cv2.circle(image, tuple(int(c) for c in p), 5, color, -1, cv2.LINE_AA)
+
+
+def draw_banner(image, rep):
+    text = f"Rep {rep['rep']}: {rep['status']}" if rep else "Rep 0"
+    color = STATUS_BGR[rep["status"]] if rep else NEUTRAL_BGR
+    scale = max(0.5, image.shape[0] / 720)
+    (tw, th), base = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+    cv2.rectangle(image, (8, 8), (24 + tw, 24 + th + base), (0, 0, 0), -1)
+    cv2.putText(image, text, (16, 16 + th), cv2.FONT_HERSHEY_SIMPLEX, scale,
+                color, 2, cv2.LINE_AA)
+
+
+class OverlayWriter:
+    """Background annotate + encode of ``(frame_no, image, landmarks)``.
+
+    ``submit`` may be called from any single thread, in frame order; gaps
+    (frames the sampler skipped) repeat the previous frame. ``out_height``
+    and ``out_fps`` bound the encode cost. Use as a context manager, or call
+    ``close()``, which waits for the file to be complete.
+    """
+
+    def __init__(self, path, fps, frame_size, out_height=None, out_fps=None,
+                 good_t=GOOD_T, bad_t=BAD_T, queue_size=QUEUE_SIZE):
+        self.path = str(path)
+        self.fps = fps
+        self.out_fps = min(out_fps or fps, fps)
+        self.size = output_size(frame_size, out_height)
+        self.step = fps / self.out_fps  # source frames per output frame
+        self.counter = LiveRepCounter(fps, good_t, bad_t)
+        self.written = 0
+        self.error = None
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame_no, image, lms, rgb=False):
+        if self.error:
+            raise self.error
+        _put(self._queue, (frame_no, image, lms, rgb), self._stop)
+
+    def close(self):
+        _put(self._queue, _DONE, self._stop)
+        self._thread.join()
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*VIDEO_CODEC),
+                                 self.out_fps, self.size)
+        pending = collections.deque()
+        reps, rep_frames = self.counter.reps, []
+        prev_points = None
+        last = None          # (frame_no, annotated image)
+        next_slot = 0
+
+        def fill(until):
+            # Output frame k shows the latest source frame at or before
+            # k * step; write every slot before source frame ``until``.
+            nonlocal next_slot
+            while last is not None and next_slot * self.step < until:
+                writer.write(last[1])
+                next_slot += 1
+                self.written += 1
+
+        def emit(frame_no, image, lms, rgb):
+            nonlocal last
+            fill(frame_no)
+            if next_slot * self.step >= frame_no + 1:
+                return  # dropped by the output frame rate; don't draw it
+            image = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+            if rgb:
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            rep_frames.extend(r["frame"] for r in reps[len(rep_frames):])
+            i = bisect.bisect_right(rep_frames, frame_no)
+            rep = reps[i - 1] if i else None
+            draw_skeleton(image, lms, STATUS_BGR[rep["status"]] if rep else NEUTRAL_BGR)
+            draw_banner(image, rep)
+            last = (frame_no, image)
+
+        try:
+            if not writer.isOpened():
+                raise RuntimeError(f"Could not open video writer for {self.path}")
+            while True:
+                item = _get(self._queue, self._stop)
+                if item is _DONE:
+                    break
+                frame_no, _, lms, _ = item
+                if lms is not None:
+                    points = lms[TRACK_POINTS, :2].astype(np.float64)
+                    if prev_points is not None:
+                        value = np.linalg.norm(points - prev_points, axis=1).mean()
+                        self.counter.push(value, frame_no)
+                    prev_points = points
+
+                pending.append(item)
+                while pending[0][0] < frame_no - LOOKBACK:
+                    emit(*pending.popleft())
+
+            self.counter.finish()
+            while pending:
+                emit(*pending.popleft())
+            if last is not None:
+                fill(last[0] + 1)
+        except Exception as exc:
+            self.error = exc
+            self._stop.set()
+        finally:
+            writer.release()
+
+
+def render_overlay(video_path, landmarks, writer):
+    """Feed a decoded video plus already-extracted ``landmarks`` to ``writer``.
+
+    For results that came from the cache, where there is no analysis pass
+    to hook into; no pose inference runs.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        frame_no = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            lms = landmarks[frame_no] if frame_no < len(landmarks) else None
+            if lms is not None and np.isnan(lms[0, 0]):
+                lms = None
+            writer.submit(frame_no, frame, lms)
+            frame_no += 1
+    finally:
+        cap.release()
+
+
+def _remove_all(paths):
+    for p in paths:
+        p.unlink(missing_ok=True)
+    paths.clear()
+
+
+class SessionOverlay:
+    """The annotated video of one session, kept on disk.
+
+    Keep one instance in ``st.session_state``: the file is deleted when the
+    next render replaces it and, through the finalizer, when the session
+    ends (also at interpreter exit).
+    """
+
+    def __init__(self):
+        self.key = None
+        self._paths = []
+        weakref.finalize(self, _remove_all, self._paths)
+
+    def path(self, key):
+        """The finished video rendered for ``key``, or None."""
+        if self.key == key and self._paths[-1:] and self._paths[-1].exists():
+            return self._paths[-1]
+        return None
+
+    def new(self):
+        """A fresh file to render into; the previous video is deleted."""
+        _remove_all(self._paths)
+        self.key = None
+        fd, path = tempfile.mkstemp(suffix=".mp4")
+        os.close(fd)
+        self._paths.append(Path(path))
+        return self._paths[-1]
+
+    def finished(self, key):
+        """Mark the file from ``new`` as the complete video for ``key``."""
+        self.key = key
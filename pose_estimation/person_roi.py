@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+
+# Person ROI + downscaling ------------------
+# Crops each frame to the region around the person found in the previous
+# frame and shrinks it to the inference resolution before cvtColor and
+# pose.process. Landmarks are mapped back to full-frame normalized
+# coordinates, so everything downstream is unaware of the crop.
+#
+# The decode thread prepares every frame with the crop as it stands; the
+# inference thread (the serial bottleneck) only redoes a frame when the
+# crop moved after it was prepared, which by design is rare.
+
+ROI_MARGIN = 0.5        # padding around the landmark bbox, as a fraction of its size
+ROI_EDGE = 0.1          # re-centre once the bbox gets this close to the crop edge
+ROI_MIN_VISIBILITY = 0.5
+ROI_MAX_MISSES = 3      # frames without a pose before falling back to full frame
+# INTER_AREA only for large downscales: it costs ~7x INTER_LINEAR at 1080p,
+# and linear only starts to alias below half size.
+AREA_SCALE = 0.5
+
+
+class PersonROI:
+    """Track the person's bounding box and prepare frames for inference.
+
+    The crop only moves when the person nears its edge (or it became much
+    too large), because MediaPipe's own tracking state lives in crop
+    coordinates and a crop that shifts every frame would fight it.
+    """
+
+    def __init__(self, inference_size=None, track=True):
+        self.inference_size = inference_size
+        self.track = track
+        self.box = None
+        self.misses = 0
+
+    def prepare(self, frame):
+        """Crop/resize a BGR frame; returns the RGB input and its crop box."""
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = self.box or (0, 0, w, h)  # one read: box may change
+        crop = frame[y0:y1, x0:x1]
+
+        if self.inference_size:
+            scale = self.inference_size / max(x1 - x0, y1 - y0)
+            if scale < 1:
+                interpolation = cv2.INTER_AREA if scale < AREA_SCALE else cv2.INTER_LINEAR
+                crop = cv2.resize(crop, None, fx=scale, fy=scale,
+                                  interpolation=interpolation)
+
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), (x0, y0, x1, y1, w, h)
+
+    def moved(self, crop):
+        """True if the crop changed since ``crop`` was prepared."""
+        x0, y0, x1, y1, w, h = crop
+        return (self.box or (0, 0, w, h)) != (x0, y0, x1, y1)
+
+    @staticmethod
+    def to_full_frame(lms, crop):
+        """Map (33, 4) crop-normalized landmarks to full-frame normalized."""
+        x0, y0, x1, y1, w, h = crop
+        out = lms.copy()
+        out[:, 0] = (lms[:, 0] * (x1 - x0) + x0) / w
+        out[:, 1] = (lms[:, 1] * (y1 - y0) + y0) / h
+        out[:, 2] = lms[:, 2] * (x1 - x0) / w  # z shares the x scale
+        return out
+
+    def update(self, lms, crop):
+        """Move the crop for the next frame based on full-frame landmarks.
+
+        Returns True when the crop changed.
+        """
+        if not self.track:
+            return False
+
+        old = self.box
+        if lms is None:
+            self.misses += 1
+            if self.misses > ROI_MAX_MISSES:
+                self.box = None
+            return self.box != old
+        self.misses = 0
+
+        _, _, _, _, w, h = crop
+        visible = lms[lms[:, 3] >= ROI_MIN_VISIBILITY]
+        if len(visible) == 0:
+            return False
+
+        bx0, by0 = visible[:, :2].min(axis=0) * (w, h)
+        bx1, by1 = visible[:, :2].max(axis=0) * (w, h)
+        bw, bh = bx1 - bx0, by1 - by0
+
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            ex, ey = (x1 - x0) * ROI_EDGE, (y1 - y0) * ROI_EDGE
+            # Sides that already sit on the frame border can't move anyway.
+            inside = (
+                (x0 == 0 or bx0 >= x0 + ex) and (y0 == 0 or by0 >= y0 + ey) and
+                (x1 == w or bx1 <= x1 - ex) and (y1 == h or by1 <= y1 - ey)
+            )
+            too_big = (x1 - x0) * (y1 - y0) > 6 * max(bw * bh, 1)
+            if inside and not too_big:
+                return False
+
+        mx, my = bw * ROI_MARGIN, bh * ROI_MARGIN
+        box = (
+            int(max(0, np.floor(bx0 - mx))),
+            int(max(0, np.floor(by0 - my))),
+            int(min(w, np.ceil(bx1 + mx))),
+            int(min(h, np.ceil(by1 + my))),
+        )
+        # Degenerate boxes (e.g. all landmarks off-screen) -> full frame
+        self.box = box if box[2] - box[0] > 16 and box[3] - box[1] > 16 else None
+        return self.box != old
@@ -0,0 +1,512 @@
+import queue
+import threading
+from contextlib import nullcontext
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from landmark_store import LandmarkBuffer
+from person_roi import PersonROI
+from pose_pool import PosePool
+from rep_analysis import PEAK_HEIGHT, WINDOW, detect_reps
+from stage_timer import NULL_TIMER
+
+# Pipelined frame engine ------------------
+# decoder thread -> bounded queue -> inference thread -> bounded queue -> caller
+# Each stage has exactly one worker, so frames come out in decode order, and
+# the bounded queues stop a fast decoder from racing ahead of MediaPipe.
+
+mp_pose = mp.solutions.pose
+
+POSE_SETTINGS = {
+    "static_image_mode": False,
+    "model_complexity": 1,
+    "min_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5,
+}
+
+# Joints to track (RIGHT SIDE)
+TRACK_POINTS = [
+    mp_pose.PoseLandmark.RIGHT_HIP.value,
+    mp_pose.PoseLandmark.RIGHT_KNEE.value,
+    mp_pose.PoseLandmark.RIGHT_ANKLE.value
+]
+
+QUEUE_SIZE = 8
+
+# A pipeline started mid-video (a shard or an analysis job's slice) decodes
+# this many frames early so MediaPipe's tracking state
+# (static_image_mode=False) has settled by the first frame it keeps; warm-up
+# detections are dropped.
+WARMUP_FRAMES = 30
+
+# Adaptive sampling: per-frame motion that switches inference back to full
+# frame rate. Standing still between sets stays under ~0.001 while working
+# sets run at 0.002-0.005 with single-frame rep spikes above 0.012, so full
+# rate is held for as long as the athlete keeps moving.
+BOOST_THRESHOLD = 0.002
+BOOST_SECONDS = 1.0
+
+# Tiered inference: a first pass with the lite model, then the full model
+# re-runs only the frame ranges where the lite result can't be trusted -
+# around candidate rep peaks (depth is measured there) and where tracked
+# joints are missing or barely visible. Each range starts REFINE_WARMUP
+# frames early so tracking has settled, and extends REFINE_RADIUS frames
+# either side of a peak so the switch between models never falls inside a
+# rep's amplitude window.
+LITE_COMPLEXITY = 0
+REFINE_VISIBILITY = 0.5
+REFINE_HEIGHT = 0.75 * PEAK_HEIGHT  # borderline peaks get refined too
+REFINE_RADIUS = WINDOW + 4
+REFINE_WARMUP = 8
+
+_DONE = object()
+
+
+def create_pose(**overrides):
+    return mp_pose.Pose(**{**POSE_SETTINGS, **overrides})
+
+
+POSE_POOL = PosePool(mp_pose.Pose)
+
+
+def checkout_pose(**overrides):
+    """``with checkout_pose() as pose:`` - a warmed, reset Pose from ``POSE_POOL``."""
+    return POSE_POOL.checkout(**{**POSE_SETTINGS, **overrides})
+
+
+def video_fps(cap):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or np.isnan(fps):
+        fps = 30  # Default to 30 if unable to get FPS
+    return fps
+
+
+def landmarks_to_array(pose_landmarks):
+    """(33, 4) float32 array of x, y, z, visibility."""
+    return np.array(
+        [[p.x, p.y, p.z, p.visibility] for p in pose_landmarks.landmark],
+        dtype=np.float32
+    )
+
+
+def _put(q, item, stop):
+    # Blocking put (backpressure) that gives up once the pipeline is stopped.
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+class AdaptiveSampler:
+    """Decide which frames go through ``pose.process``.
+
+    Frames are inferred every ``stride`` frames (``fps / target_fps``). When
+    the per-frame motion between two inferred detections reaches
+    ``boost_threshold`` every frame is inferred for the next
+    ``boost_seconds``, so rep peaks are captured at full frame rate.
+    """
+
+    def __init__(self, fps, target_fps, boost_threshold=BOOST_THRESHOLD,
+                 boost_seconds=BOOST_SECONDS):
+        self.stride = max(1, int(round(fps / target_fps)))
+        self.boost_threshold = boost_threshold
+        self.boost_frames = int(round(fps * boost_seconds))
+        self.boost_until = -1
+        self._prev = None
+
+    def wants(self, frame_no):
+        return frame_no % self.stride == 0 or frame_no <= self.boost_until
+
+    def observe(self, frame_no, lms):
+        if lms is None:
+            return
+        points = lms[TRACK_POINTS, :2]
+        if self._prev is not None:
+            prev_no, prev_points = self._prev
+            speed = np.linalg.norm(points - prev_points, axis=1).mean()
+            if speed / (frame_no - prev_no) >= self.boost_threshold:
+                self.boost_until = frame_no + self.boost_frames
+        self._prev = (frame_no, points)
+
+
+class FramePipeline:
+    """Iterate over ``(frame_no, landmarks)`` for every inferred frame.
+
+    ``landmarks`` is ``None`` when no pose was detected. Pass ``pose`` to
+    reuse an existing ``mp_pose.Pose``; otherwise one is checked out of
+    ``POSE_POOL`` for the duration of the iteration. ``start``/``end`` restrict decoding to a frame range.
+
+    With ``target_fps`` set, frames the ``AdaptiveSampler`` doesn't want are
+    skipped with ``cap.grab()`` and never yielded. ``inference_size`` and
+    ``track_roi`` shrink/crop frames before inference (see ``PersonROI``);
+    landmarks are always full-frame normalized.
+
+    ``model_complexity`` overrides ``POSE_SETTINGS`` for the pose the
+    pipeline checks out itself. ``timer`` (a ``StageTimer``) receives
+    per-frame decode/color/crop/inference timings and ``skipped``/
+    ``undetected``/``recropped`` frame counts.
+
+    ``frame_sink(frame_no, image, landmarks, rgb)`` is called on the
+    inference thread with every inferred full-resolution frame (e.g.
+    ``OverlayWriter.submit``); ``rgb`` tells the image's channel order.
+    """
+
+    def __init__(self, video_path, pose=None, queue_size=QUEUE_SIZE,
+                 start=0, end=None, target_fps=None, inference_size=None,
+                 track_roi=False, timer=NULL_TIMER, model_complexity=None,
+                 frame_sink=None):
+        self.video_path = str(video_path)
+        self.pose = pose
+        self.queue_size = queue_size
+        self.start = start
+        self.end = end
+        self.decoded = 0
+        self.inferred = 0
+        self.timer = timer
+        self.model_complexity = model_complexity
+        self.frame_sink = frame_sink
+
+        cap = cv2.VideoCapture(self.video_path)
+        self.fps = video_fps(cap)
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_size = (
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        )
+        cap.release()
+
+        self.sampler = None
+        if target_fps and target_fps < self.fps:
+            self.sampler = AdaptiveSampler(self.fps, target_fps)
+            # A short queue keeps the decoder close to the sampler's feedback.
+            self.queue_size = min(self.queue_size, 2)
+
+        self.roi = None
+        if inference_size or track_roi:
+            # Frames are cropped on the decode thread; the inference thread
+            # only recrops those whose crop moved in the meantime.
+            self.roi = PersonROI(inference_size, track_roi)
+
+    def _decode(self, cap, out_q, stop):
+        timer = self.timer
+        try:
+            frame_no = self.start
+            if self.start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+            while cap.isOpened() and not stop.is_set():
+                if self.end is not None and frame_no >= self.end:
+                    break
+
+                if self.sampler and not self.sampler.wants(frame_no):
+                    t0 = timer.clock()
+                    if not cap.grab():
+                        break
+                    timer.record("grab", t0)
+                    timer.count("skipped")
+                    frame_no += 1
+                    continue
+
+                t0 = timer.clock()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                timer.record("decode", t0)
+
+                t0 = timer.clock()
+                if self.roi:
+                    image, crop = self.roi.prepare(frame)
+                    timer.record("crop", t0)
+                else:
+                    frame = image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    crop = None
+                    timer.record("color", t0)
+                if not _put(out_q, (frame_no, frame, image, crop), stop):
+                    break
+                frame_no += 1
+        except Exception as exc:
+            _put(out_q, exc, stop)
+        finally:
+            self.decoded = frame_no - self.start
+            cap.release()
+            _put(out_q, _DONE, stop)
+
+    def _infer(self, pose, in_q, out_q, stop):
+        timer = self.timer
+        try:
+            while True:
+                item = _get(in_q, stop)
+                if item is _DONE or isinstance(item, Exception):
+                    _put(out_q, item, stop)
+                    return
+
+                frame_no, frame, image, crop = item
+                if crop and self.roi.moved(crop):
+                    t0 = timer.clock()
+                    image, crop = self.roi.prepare(frame)
+                    timer.record("recrop", t0)
+                    timer.count("recropped")
+
+                t0 = timer.clock()
+                result = pose.process(image)
+                timer.record("inference", t0)
+                lms = None
+                if result.pose_landmarks:
+                    lms = landmarks_to_array(result.pose_landmarks)
+                    if crop:
+                        lms = PersonROI.to_full_frame(lms, crop)
+                else:
+                    timer.count("undetected")
+
+                if self.roi and self.roi.update(lms, crop):
+                    # Pose's tracking/smoothing state is in the old crop's
+                    # coordinates; carrying it over shows up as a fake spike.
+                    pose.reset()
+                if self.sampler:
+                    self.sampler.observe(frame_no, lms)
+                if self.frame_sink:
+                    self.frame_sink(frame_no, frame, lms, not self.roi)
+                if not _put(out_q, (frame_no, lms), stop):
+                    return
+        except Exception as exc:
+            _put(out_q, exc, stop)
+
+    def __iter__(self):
+        overrides = {}
+        if self.model_complexity is not None:
+            overrides["model_complexity"] = self.model_complexity
+        with nullcontext(self.pose) if self.pose else checkout_pose(**overrides) as pose:
+            yield from self._run(pose)
+
+    def _run(self, pose):
+        stop = threading.Event()
+        frames_q = queue.Queue(maxsize=self.queue_size)
+        results_q = queue.Queue(maxsize=self.queue_size)
+
+        workers = [
+            threading.Thread(
+                target=self._decode,
+                args=(cv2.VideoCapture(self.video_path), frames_q, stop),
+                daemon=True
+            ),
+            threading.Thread(
+                target=self._infer,
+                args=(pose, frames_q, results_q, stop),
+                daemon=True
+            ),
+        ]
+        for w in workers:
+            w.start()
+
+        self.inferred = 0
+        try:
+            while True:
+                item = _get(results_q, stop)
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                self.inferred += 1
+                yield item
+        finally:
+            stop.set()
+            for w in workers:
+                w.join()
+
+
+def collect_landmarks(pipeline):
+    """Run a pipeline into a ``LandmarkBuffer``.
+
+    Returns the (frames, 33, 4) landmark tensor for the decoded range (row 0
+    is ``pipeline.start``; NaN where nothing was detected) and every frame
+    number that went through inference.
+    """
+    expected = pipeline.frame_count - pipeline.start
+    if pipeline.end is not None:
+        expected = min(expected, pipeline.end - pipeline.start)
+    buf = LandmarkBuffer(expected)
+
+    sampled = []
+    for frame_no, lms in pipeline:
+        sampled.append(frame_no)
+        if lms is not None:
+            buf.put(frame_no - pipeline.start, lms)
+
+    return buf.finish(pipeline.decoded), np.array(sampled, dtype=np.int64)
+
+
+def detected_frames(landmarks):
+    return np.flatnonzero(~np.isnan(landmarks[:, 0, 0]))
+
+
+def fill_skipped(landmarks, sampled, chunk=65536):
+    """Linearly interpolate landmarks, in place, for frames the sampler skipped.
+
+    Only gaps between two consecutive inferred frames that were both
+    detected are filled; frames next to a missed detection stay missing,
+    exactly like undetected frames in full mode.
+    """
+    frames = detected_frames(landmarks)
+    if len(frames) < 2:
+        return
+
+    left, right = frames[:-1], frames[1:]
+    # right is the very next inferred frame after left -> nothing in between
+    # was undetected, only skipped.
+    nxt = np.searchsorted(sampled, left) + 1
+    gaps = np.where(sampled[nxt] == right, right - left - 1, 0)
+    total = int(gaps.sum())
+    if total == 0:
+        return
+
+    seg = np.repeat(np.arange(len(left)), gaps)
+    offset = np.arange(total) - np.repeat(np.cumsum(gaps) - gaps, gaps) + 1
+    # Chunked so filling hours of skipped frames needs little scratch memory.
+    for i in range(0, total, chunk):
+        s, o = seg[i:i + chunk], offset[i:i + chunk]
+        lo, hi = landmarks[left[s]], landmarks[right[s]]
+        t = (o / (right[s] - left[s]))[:, None, None].astype(np.float32)
+        landmarks[left[s] + o] = lo + (hi - lo) * t
+
+
+def motion_from_track(frames, points):
+    """Average joint displacement between consecutive detections.
+
+    ``movement_values[i]`` belongs to detection ``frame_index[i]`` and is
+    measured against the previous detected frame, so the first detection
+    has no value.
+    """
+    diffs = np.linalg.norm(points[1:] - points[:-1], axis=2)
+    movement_values = diffs.mean(axis=1)
+    frame_index = frames[1:].tolist()
+    return movement_values, frame_index
+
+
+def motion_result(fps, landmarks, sampled, frame_size=(0, 0)):
+    fill_skipped(landmarks, sampled)
+    frames = detected_frames(landmarks)
+    points = landmarks[:, TRACK_POINTS, :2][frames].astype(np.float64)
+    movement_values, frame_index = motion_from_track(frames, points)
+
+    frame_count = len(landmarks)
+    duration = frame_count / fps if frame_count else 0
+    return {
+        "fps": fps,
+        "frame_count": frame_count,
+        "frame_size": np.array(frame_size),
+        "inferred_frames": len(sampled),
+        "inference_fps": len(sampled) / duration if duration else 0.0,
+        "landmarks": landmarks,
+        "movement_values": movement_values,
+        "frame_index": frame_index,
+    }
+
+
+def refine_segments(landmarks, sampled, radius=REFINE_RADIUS,
+                    merge_gap=2 * REFINE_WARMUP):
+    """``[(start, end)]`` frame ranges for the full model after a lite pass.
+
+    Ranges cover ``radius`` frames around every candidate peak of the lite
+    motion signal and every inferred frame whose tracked joints are missing
+    or below ``REFINE_VISIBILITY``. Ranges closer than ``merge_gap`` are
+    merged, since restarting the tracker costs more than bridging the gap.
+    """
+    n = len(landmarks)
+    marks = np.zeros(n + 1, dtype=np.int64)
+
+    visibility = np.nan_to_num(landmarks[sampled][:, TRACK_POINTS, 3], nan=0.0)
+    weak = sampled[visibility.min(axis=1) < REFINE_VISIBILITY]
+    np.add.at(marks, weak, 1)
+    np.add.at(marks, weak + 1, -1)
+
+    track = np.array(landmarks[:, TRACK_POINTS])  # small copy, filled below
+    fill_skipped(track, sampled)
+    frames = detected_frames(track)
+    movement_values, frame_index = motion_from_track(
+        frames, track[frames][:, :, :2].astype(np.float64)
+    )
+    peaks = np.asarray(frame_index, dtype=np.int64)[
+        detect_reps(movement_values, height=REFINE_HEIGHT)
+    ]
+    np.add.at(marks, np.maximum(peaks - radius, 0), 1)
+    np.add.at(marks, np.minimum(peaks + radius + 1, n), -1)
+
+    covered = np.cumsum(marks[:n]) > 0
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], covered, [0]])))
+    segments = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if segments and start - segments[-1][1] < merge_gap:
+            segments[-1] = (segments[-1][0], int(end))
+        else:
+            segments.append((int(start), int(end)))
+    return segments
+
+
+def refine_landmarks(video_path, landmarks, sampled, timer=NULL_TIMER,
+                     **options):
+    """Re-run ``refine_segments`` with the full model, in place.
+
+    Full-model detections replace the lite ones; where the full model finds
+    nobody the lite result is kept. Every refined frame is inferred, so the
+    returned ``sampled`` is the union of both passes. Also returns the
+    number of full-model inferences (warm-up frames included).
+    """
+    options = {**options, "target_fps": None, "frame_sink": None}
+    refined = [sampled]
+    full_frames = 0
+    with checkout_pose() as pose:
+        for start, end in refine_segments(landmarks, sampled):
+            warm_start = max(0, start - REFINE_WARMUP)
+            pose.reset()
+            pipeline = FramePipeline(video_path, pose, start=warm_start,
+                                     end=end, timer=timer, **options)
+            seg, seg_sampled = collect_landmarks(pipeline)
+            full_frames += pipeline.inferred
+
+            seg = seg[start - warm_start:]
+            found = ~np.isnan(seg[:, 0, 0])
+            landmarks[start:start + len(seg)][found] = seg[found]
+            refined.append(seg_sampled[seg_sampled >= start])
+
+    timer.count("full_model", full_frames)
+    return np.unique(np.concatenate(refined)), full_frames
+
+
+def extract_motion(video_path, pose=None, timer=NULL_TIMER, tiered=False,
+                   **options):
+    """Run the pose pipeline; returns the motion signal and full landmarks.
+
+    ``options`` are passed to ``FramePipeline``. With ``target_fps`` set,
+    skipped frames are filled in by interpolation so ``frame_index`` still
+    counts real video frames. ``tiered`` runs the lite model first and the
+    full model only where needed (see ``refine_segments``); the result then
+    also has ``lite_frames``/``full_frames`` inference counts.
+    """
+    complexity = LITE_COMPLEXITY if tiered else None
+    pipeline = FramePipeline(video_path, pose, timer=timer,
+                             model_complexity=complexity, **options)
+    landmarks, sampled = collect_landmarks(pipeline)
+
+    if tiered:
+        lite_frames = len(sampled)
+        sampled, full_frames = refine_landmarks(video_path, landmarks, sampled,
+                                                timer, **options)
+    with timer.stage("motion"):
+        motion = motion_result(pipeline.fps, landmarks, sampled,
+                               pipeline.frame_size)
+    if tiered:
+        motion.update(lite_frames=lite_frames, full_frames=full_frames)
+    return motion
@@ -0,0 +1,122 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# Pose model pool ------------------
+# Building a MediaPipe Pose is cheap, but its first ``process`` call loads the
+# model and starts the graph (~0.2 s), and ``reset()`` restarts the graph at
+# the same cost. The pool keeps finished instances per configuration and
+# hands each to one caller at a time. On return an instance is reset, so no
+# tracking state leaks into the next video, and re-warmed on a blank frame.
+# Nothing is detected on that frame, so no tracking or smoothing state
+# survives it, and results match a fresh instance exactly.
+#
+# At most MAX_POSES instances exist; further checkouts wait for one to come
+# back, so concurrent analyses don't oversubscribe the CPU.
+
+MAX_POSES = int(os.environ.get("POSE_POOL_SIZE", os.cpu_count() or 1))
+
+WARM_FRAME = np.zeros((64, 64, 3), dtype=np.uint8)
+
+
+def _config_key(config):
+    return tuple(sorted(config.items()))
+
+
+class PosePool:
+    """Thread-safe pool of warmed ``factory(**config)`` instances.
+
+    ``with pool.checkout(**config) as pose:`` gives exclusive use of one
+    instance; instances of other configurations that sit idle are closed
+    to make room when the pool is full.
+    """
+
+    def __init__(self, factory, max_size=MAX_POSES):
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self._cond = threading.Condition()
+        self._idle = {}  # config key -> [instance]
+        self._size = 0   # idle + checked out
+
+    def _create(self, config):
+        pose = self.factory(**config)
+        pose.process(WARM_FRAME)
+        return pose
+
+    def _reserve(self, key):
+        """An idle instance for ``key``, or None after reserving a new slot."""
+        while True:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+            if self._size < self.max_size:
+                self._size += 1
+                return None
+            others = [poses for k, poses in self._idle.items() if poses]
+            if others:
+                others[0].pop().close()  # its slot goes to ``key``
+                return None
+            self._cond.wait()
+
+    def _discard(self, pose):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        if pose is not None:
+            pose.close()
+
+    @contextmanager
+    def checkout(self, **config):
+        key = _config_key(config)
+        with self._cond:
+            pose = self._reserve(key)
+        if pose is None:
+            try:
+                pose = self._create(config)
+            except BaseException:
+                self._discard(None)
+                raise
+        try:
+            yield pose
+        finally:
+            try:
+                pose.reset()
+                pose.process(WARM_FRAME)
+            except Exception:
+                self._discard(pose)
+            else:
+                with self._cond:
+                    self._idle.setdefault(key, []).append(pose)
+                    self._cond.notify()
+
+    def warm(self, n=1, **config):
+        """Create instances until ``n`` for ``config`` are idle (pool size permitting)."""
+        key = _config_key(config)
+        with self._cond:
+            missing = min(n - len(self._idle.get(key, ())),
+                          self.max_size - self._size)
+            missing = max(0, missing)
+            self._size += missing
+        for i in range(missing):
+            try:
+                pose = self._create(config)
+            except BaseException:
+                with self._cond:
+                    self._size -= missing - i
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._idle.setdefault(key, []).append(pose)
+                self._cond.notify()
+
+    def close(self):
+        """Close every idle instance."""
+        with self._cond:
+            idle = [p for poses in self._idle.values() for p in poses]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pose in idle:
+            pose.close()
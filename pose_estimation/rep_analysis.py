@@ -0,0 +1,121 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import find_peaks
+
+# Rep detection + quality analysis ------------------
+# Shared by the CLI and the Streamlit app. Every rule is evaluated for all
+# peaks at once, and the result is columnar (dict of equal-length arrays),
+# so pd.DataFrame(reps) gives the rep table directly.
+
+PEAK_HEIGHT = 0.012   # tuned for your video
+PEAK_DISTANCE = 16
+
+GOOD_T = 0.022
+BAD_T = 0.013
+WINDOW = 12
+MAX_AMP = 0.05
+SPIKE_T = 0.045
+
+STATUS_COLORS = {"GOOD": "green", "BAD": "orange", "POOR": "red"}
+
+RISK_REASONS = {
+    "poor": "Very low depth may increase joint strain",
+    "spike": "Sudden uncontrolled movement spike",
+    "fatigue": "Quality drop after good rep (fatigue)",
+}
+
+
+def detect_reps(movement_values, height=PEAK_HEIGHT, distance=PEAK_DISTANCE,
+                prominence=None):
+    peaks, _ = find_peaks(movement_values, height=height, distance=distance,
+                          prominence=prominence)
+    return peaks
+
+
+def window_amplitudes(movement_values, peaks, window=WINDOW):
+    """max - min of ``movement_values[peak - window:peak + window]`` per peak."""
+    values = np.asarray(movement_values, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.intp)
+    if len(peaks) == 0:
+        return np.zeros(0)
+
+    # Pad so every window has the same length; padding never wins max/min.
+    hi = np.pad(values, window, constant_values=-np.inf)
+    lo = np.pad(values, window, constant_values=np.inf)
+    # Window for peak p starts at p - window, i.e. at p in padded coordinates.
+    hi = sliding_window_view(hi, 2 * window)[peaks]
+    lo = sliding_window_view(lo, 2 * window)[peaks]
+    return hi.max(axis=1) - lo.min(axis=1)
+
+
+def score_reps(amp, good_t=GOOD_T, bad_t=BAD_T, max_amp=MAX_AMP,
+               spike_t=SPIKE_T, reasons=RISK_REASONS, prev_good=False):
+    """Depth, GOOD/BAD/POOR status and injury-risk flags from window amplitudes.
+
+    Risk rules, later ones taking precedence for ``reason``:
+    POOR rep, amplitude spike above ``spike_t``, and a non-GOOD rep right
+    after a GOOD one (fatigue). ``prev_good`` is the status of the rep
+    before ``amp[0]`` when reps are scored a few at a time.
+    """
+    amp = np.asarray(amp, dtype=np.float64)
+    depth = np.minimum(100, (amp / max_amp * 100).astype(int))
+
+    good = amp >= good_t
+    bad = ~good & (amp >= bad_t)
+    poor = ~good & ~bad
+    status = np.where(good, "GOOD", np.where(bad, "BAD", "POOR")).astype(object)
+    color = np.where(
+        good, STATUS_COLORS["GOOD"],
+        np.where(bad, STATUS_COLORS["BAD"], STATUS_COLORS["POOR"])
+    ).astype(object)
+
+    spike = amp > spike_t
+    fatigue = ~good & np.concatenate([[prev_good], good[:-1]])
+    injury_risk = poor | spike | fatigue
+    reason = np.select(
+        [fatigue, spike, poor],
+        [reasons["fatigue"], reasons["spike"], reasons["poor"]],
+        default=""
+    ).astype(object)
+    reason[~injury_risk] = None
+
+    return {
+        "amplitude": amp,
+        "depth": depth,
+        "status": status,
+        "color": color,
+        "injury_risk": injury_risk,
+        "reason": reason,
+    }
+
+
+def analyze_reps(movement_values, frame_index, fps, peaks=None,
+                 good_t=GOOD_T, bad_t=BAD_T, window=WINDOW, max_amp=MAX_AMP,
+                 spike_t=SPIKE_T, reasons=RISK_REASONS):
+    """Detect (unless ``peaks`` is given) and score every rep; see ``score_reps``."""
+    movement_values = np.asarray(movement_values, dtype=np.float64)
+    if peaks is None:
+        peaks = detect_reps(movement_values)
+    peaks = np.asarray(peaks, dtype=np.intp)
+
+    amp = window_amplitudes(movement_values, peaks, window)
+    frames = np.asarray(frame_index, dtype=np.int64)[peaks]
+    return {
+        "rep": np.arange(1, len(peaks) + 1),
+        "peak": peaks,
+        "frame": frames,
+        "time": np.round(frames / fps, 2),
+        "value": movement_values[peaks],
+        **score_reps(amp, good_t, bad_t, max_amp, spike_t, reasons),
+    }
+
+
+def summarize_reps(reps):
+    status = reps["status"]
+    return {
+        "total": len(status),
+        "good": int(np.count_nonzero(status == "GOOD")),
+        "bad": int(np.count_nonzero(status == "BAD")),
+        "poor": int(np.count_nonzero(status == "POOR")),
+        "risky": int(np.count_nonzero(reps["injury_risk"])),
+    }
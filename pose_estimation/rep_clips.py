@@ -0,0 +1,218 @@
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from overlay_video import VIDEO_CODEC
+from pose_pipeline import video_fps
+
+# Rep clips ------------------
+# A seek index (timestamp of every frame, frame numbers of the keyframes)
+# is read from the container in one demux pass: packets only, nothing is
+# decoded, so it costs milliseconds per minute of video. The analysis job
+# builds it alongside its first slice; it is stored per video digest.
+#
+# Reviewing a rep seeks straight to the last keyframe before its window and
+# decodes only from there, instead of from the start of the file. The clip
+# (mp4) and frame strip (jpg) are cached next to the index, so repeat views
+# are file reads. The oldest videos' clips are evicted past MAX_CLIP_BYTES.
+
+CLIP_DIR = Path(os.environ.get(
+    "POSE_CLIP_DIR", Path.home() / ".cache" / "pose_estimation" / "clips"
+))
+MAX_CLIP_BYTES = int(os.environ.get("POSE_CLIP_MAX_BYTES", 256 * 1024 * 1024))
+
+CLIP_PAD_SECONDS = 0.5    # before and after the rep window
+CLIP_HEIGHT = 480
+STRIP_FRAMES = 6
+STRIP_HEIGHT = 180
+
+
+def build_seek_index(video_path):
+    """``{"fps", "times", "keyframes"}``: presentation time (s) of every frame
+    and the keyframe numbers, from the container's packets.
+
+    Backends without raw packet access get nominal times and frame 0 as the
+    only keyframe (seeks then decode from the start).
+    """
+    cap = cv2.VideoCapture(str(video_path), cv2.CAP_FFMPEG)
+    fps = video_fps(cap)
+    times, keyframes = [], []
+    try:
+        if cap.isOpened() and cap.set(cv2.CAP_PROP_FORMAT, -1):
+            while cap.grab():
+                if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                    keyframes.append(len(times))
+                times.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+        else:
+            times = np.arange(int(cap.get(cv2.CAP_PROP_FRAME_COUNT))) / fps
+    finally:
+        cap.release()
+    # Packets come in decode order; with B-frames that isn't display order.
+    return {
+        "fps": fps,
+        "times": np.sort(np.asarray(times, dtype=np.float64)),
+        "keyframes": np.asarray(keyframes or [0], dtype=np.int64),
+    }
+
+
+def _dir(digest):
+    return CLIP_DIR / digest
+
+
+def seek_index(video_path, digest):
+    """Cached ``build_seek_index`` for the video with content hash ``digest``."""
+    path = _dir(digest) / "index.npz"
+    try:
+        with np.load(path) as data:
+            return {"fps": float(data["fps"]), "times": data["times"],
+                    "keyframes": data["keyframes"]}
+    except (OSError, ValueError):
+        pass
+
+    index = build_seek_index(video_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **index)
+    os.replace(tmp, path)  # readers never see a half-written index
+    return index
+
+
+def frame_time(index, frame):
+    """Presentation time of ``frame`` in seconds."""
+    times = index["times"]
+    if 0 <= frame < len(times):
+        return float(times[frame])
+    return frame / index["fps"]
+
+
+def keyframe_before(index, frame):
+    keys = index["keyframes"]
+    return int(keys[max(0, np.searchsorted(keys, frame, side="right") - 1)])
+
+
+def rep_window(index, frame, window, pad=CLIP_PAD_SECONDS):
+    """``[start, end)`` frames around a rep peak: its scoring ``window``
+    (in frames) plus ``pad`` seconds on either side."""
+    margin = window + int(round(pad * index["fps"]))
+    end = frame + margin + 1
+    if len(index["times"]):
+        end = min(end, len(index["times"]))
+    return max(0, frame - margin), end
+
+
+def read_frames(video_path, index, start, end, frames=None):
+    """Yield ``(frame_no, image)`` for ``[start, end)`` (or only ``frames``),
+    decoding from the last keyframe before ``start``."""
+    wanted = None if frames is None else set(frames)
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        frame_no = keyframe_before(index, start)
+        if frame_no:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
+        while frame_no < end:
+            # Frames that aren't shown are only decoded, not converted.
+            if frame_no < start or (wanted is not None and frame_no not in wanted):
+                if not cap.grab():
+                    break
+            else:
+                ok, image = cap.read()
+                if not ok:
+                    break
+                yield frame_no, image
+            frame_no += 1
+    finally:
+        cap.release()
+
+
+def _resize(image, height):
+    h, w = image.shape[:2]
+    if h <= height:
+        return image
+    return cv2.resize(image, (round(w * height / h), height),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _store(path, write):
+    """Write a cache file through ``write(tmp_path)`` and evict old clips."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"tmp_{path.name}")
+    write(tmp)
+    os.replace(tmp, path)
+    evict()
+    return path
+
+
+def rep_clip(video_path, digest, start, end, height=CLIP_HEIGHT):
+    """Path of an mp4 of frames ``[start, end)``, cut on first use."""
+    path = _dir(digest) / f"clip_{start}_{end}_{height}.mp4"
+    if path.exists():
+        os.utime(path.parent)  # mark the video as recently used
+        return path
+    index = seek_index(video_path, digest)
+
+    def write(tmp):
+        writer = None
+        try:
+            for _, image in read_frames(video_path, index, start, end):
+                image = _resize(image, height)
+                if writer is None:
+                    h, w = image.shape[:2]
+                    writer = cv2.VideoWriter(str(tmp), cv2.VideoWriter_fourcc(*VIDEO_CODEC),
+                                             index["fps"], (w, h))
+                writer.write(image)
+        finally:
+            if writer is not None:
+                writer.release()
+        if writer is None:
+            raise ValueError(f"No frames could be decoded in [{start}, {end})")
+
+    return _store(path, write)
+
+
+def rep_strip(video_path, digest, start, end, count=STRIP_FRAMES,
+              height=STRIP_HEIGHT):
+    """Path of a jpg with ``count`` evenly spaced frames of ``[start, end)``,
+    each stamped with its time."""
+    path = _dir(digest) / f"strip_{start}_{end}_{count}_{height}.jpg"
+    if path.exists():
+        os.utime(path.parent)
+        return path
+    index = seek_index(video_path, digest)
+    frames = np.unique(np.linspace(start, end - 1, count).round().astype(int))
+
+    def write(tmp):
+        tiles = []
+        for frame_no, image in read_frames(video_path, index, start, end, frames):
+            tile = cv2.resize(image, (round(image.shape[1] * height / image.shape[0]), height),
+                              interpolation=cv2.INTER_AREA)
+            cv2.putText(tile, f"{frame_time(index, frame_no):.2f}s", (6, 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 2, cv2.LINE_AA)
+            tiles.append(tile)
+        if not tiles:
+            raise ValueError(f"No frames could be decoded in [{start}, {end})")
+        cv2.imwrite(str(tmp), np.hstack(tiles))
+
+    return _store(path, write)
+
+
+def evict(max_bytes=MAX_CLIP_BYTES):
+    """Delete the clips of least recently used videos until the cache fits
+    ``max_bytes``; seek indexes are kept."""
+    entries = []
+    for d in CLIP_DIR.glob("*"):
+        try:
+            clips = [p for p in d.iterdir() if p.name != "index.npz"]
+            entries.append((d.stat().st_mtime, sum(p.stat().st_size for p in clips), clips))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, clips in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        for p in clips:
+            p.unlink(missing_ok=True)
+        total -= size
@@ -0,0 +1,191 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import irfft, next_fast_len, rfft
+from scipy.signal import find_peaks
+
+# Rep period estimation ------------------
+# Instead of one peak spacing and height for every athlete, the rep period
+# is measured from the signal itself: the autocorrelation (computed with an
+# FFT, O(n log n)) peaks at the lag of one rep. It is estimated over
+# sliding windows, so the spacing follows tempo changes within a set, and
+# every window gets
+#
+#   distance = DISTANCE_FRACTION * period
+#   height   = valley + HEIGHT_FRACTION * (peak - valley)
+#
+# from the typical per-cycle maximum and minimum. Rest periods (signal
+# activity below REST_RATIO of the working level for REST_SECONDS) are
+# labelled and never scanned for peaks. Windows without a clear period
+# fall back to the fixed thresholds.
+
+# Short enough for fast tempos; noise is rejected by MIN_PERIODICITY instead.
+MIN_REP_SECONDS = 0.4
+MAX_REP_SECONDS = 8.0
+PERIOD_WINDOW_SECONDS = 12.0
+MIN_PERIODICITY = 0.35     # normalized autocorrelation at the period
+
+DISTANCE_FRACTION = 0.6
+HEIGHT_FRACTION = 0.5
+
+ACTIVITY_SECONDS = 1.0     # rolling std window for rest detection
+REST_RATIO = 0.1
+REST_SECONDS = 3.0
+
+
+def autocorrelation(x):
+    """Normalized autocorrelation of ``x`` for lags 0..len(x)-1 (via FFT)."""
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x.mean()
+    n = len(x)
+    nfft = next_fast_len(2 * n - 1, real=True)  # padding avoids wrap-around
+    ac = irfft(np.abs(rfft(x, nfft)) ** 2, nfft)[:n]
+    return ac / ac[0] if n and ac[0] > 0 else np.zeros(n)
+
+
+def dominant_period(x, min_lag, max_lag, min_periodicity=MIN_PERIODICITY):
+    """``(lag, strength)`` of the strongest autocorrelation peak in
+    ``[min_lag, max_lag]``; lag is None if no peak reaches ``min_periodicity``.
+
+    A shorter lag within 85% of the strongest peak wins, so a multiple of the
+    period is never picked over the period itself.
+    """
+    ac = autocorrelation(x)
+    max_lag = min(max_lag, len(ac) - 1)
+    if max_lag <= min_lag:
+        return None, 0.0
+    lags, _ = find_peaks(ac[:max_lag + 1])
+    lags = lags[lags >= min_lag]
+    if len(lags) == 0 or ac[lags].max() < min_periodicity:
+        return None, 0.0
+    strong = lags[ac[lags] >= 0.85 * ac[lags].max()]
+    lag = int(strong[0])
+    return lag, float(ac[lag])
+
+
+def rest_mask(values, rate):
+    """True for samples inside a rest period."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    win = max(2, int(round(ACTIVITY_SECONDS * rate)))
+    if n < win:
+        return np.zeros(n, dtype=bool)
+
+    activity = np.empty(n)
+    std = sliding_window_view(values, win).std(axis=1)
+    activity[win // 2:win // 2 + len(std)] = std
+    activity[:win // 2] = std[0]
+    activity[win // 2 + len(std):] = std[-1]
+
+    quiet = activity < REST_RATIO * np.percentile(activity, 95)
+    # Keep only quiet runs long enough to be a rest between sets.
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], quiet, [0]])))
+    mask = np.zeros(n, dtype=bool)
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start >= REST_SECONDS * rate:
+            mask[start:end] = True
+    return mask
+
+
+def runs(mask):
+    """``[(start, end)]`` of the True runs in ``mask``."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def _thresholds(x, period):
+    """``(distance, height)`` for a window with a ``period`` (samples)."""
+    cycles = len(x) // period
+    chunks = np.asarray(x[:cycles * period]).reshape(cycles, period)
+    peak = np.median(chunks.max(axis=1))
+    valley = np.median(chunks.min(axis=1))
+    distance = max(1, int(DISTANCE_FRACTION * period))
+    return distance, valley + HEIGHT_FRACTION * (peak - valley)
+
+
+def period_windows(values, rate):
+    """The threshold-independent part of ``adaptive_reps``.
+
+    Returns ``(windows, rest)``. Every window is ``(lo, hi, core_lo,
+    core_hi, period, distance, height)`` in sample indices: peaks are
+    searched in ``[lo, hi)`` and kept in the core. ``distance``/``height``
+    are None where the fixed fallback applies, ``period`` where none was
+    found.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rest = rest_mask(values, rate)
+    min_lag = max(2, int(MIN_REP_SECONDS * rate))
+    max_lag = int(MAX_REP_SECONDS * rate)
+    window = int(PERIOD_WINDOW_SECONDS * rate)
+    hop = max(1, window // 2)
+
+    windows = []
+    for start, end in runs(~rest):
+        seg = values[start:end]
+        seg_period, _ = dominant_period(seg, min_lag, max_lag)
+        # Cores of ``hop`` samples, each measured over the ``window``
+        # centred on it.
+        for core in range(0, len(seg), hop):
+            lo = max(0, core + hop // 2 - window // 2)
+            hi = min(len(seg), lo + window)
+            lo = max(0, hi - window)
+            period, _ = dominant_period(seg[lo:hi], min_lag, max_lag)
+            period = period or seg_period
+            distance = height = None
+            if period and (hi - lo) >= period:
+                distance, height = _thresholds(seg[lo:hi], period)
+            windows.append((start + lo, start + hi, start + core,
+                            start + core + hop, period, distance, height))
+    return windows, rest
+
+
+def search_window(values, window, fallback_height, fallback_distance,
+                  prominence=None):
+    """Peaks in the core of one ``period_windows`` window."""
+    lo, hi, core_lo, core_hi, _, distance, height = window
+    if distance is None:
+        distance, height = fallback_distance, fallback_height
+    found, _ = find_peaks(values[lo:hi], height=height, distance=distance,
+                          prominence=prominence)
+    found = found + lo
+    return found[(found >= core_lo) & (found < core_hi)]
+
+
+def merge_windows(values, windows, found, fallback_distance):
+    """``(peaks, periods)`` from every window's ``search_window`` result."""
+    # Cores are scanned separately; drop the lower of two peaks that are
+    # closer than their spacing allows.
+    keep_p, keep_t = [], []
+    for window, peaks in zip(windows, found):
+        t = window[4] or np.nan
+        spacing = fallback_distance if np.isnan(t) else DISTANCE_FRACTION * t
+        for p in peaks.tolist():
+            if keep_p and p - keep_p[-1] < spacing:
+                if values[p] > values[keep_p[-1]]:
+                    keep_p[-1], keep_t[-1] = p, t
+                continue
+            keep_p.append(p)
+            keep_t.append(t)
+    return np.array(keep_p, dtype=np.intp), np.array(keep_t, dtype=np.float64)
+
+
+def window_peaks(values, windows, fallback_height, fallback_distance,
+                 prominence=None):
+    """``(peaks, periods)`` for ``period_windows``; see ``adaptive_reps``."""
+    values = np.asarray(values, dtype=np.float64)
+    found = [search_window(values, w, fallback_height, fallback_distance, prominence)
+             for w in windows]
+    return merge_windows(values, windows, found, fallback_distance)
+
+
+def adaptive_reps(values, rate, fallback_height, fallback_distance,
+                  prominence=None):
+    """Peaks with per-window spacing and height derived from the rep period.
+
+    Returns ``(peaks, periods, rest)``: peak indices, the period (in
+    samples; NaN where the fixed fallback was used) behind every peak, and
+    the rest mask.
+    """
+    windows, rest = period_windows(values, rate)
+    peaks, periods = window_peaks(values, windows, fallback_height,
+                                  fallback_distance, prominence)
+    return peaks, periods, rest
\ No newline at end of file
@@ -0,0 +1,106 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from landmark_store import LandmarkBuffer
+from pose_pipeline import (
+    LITE_COMPLEXITY,
+    WARMUP_FRAMES,
+    FramePipeline,
+    collect_landmarks,
+    extract_motion,
+    motion_result,
+    refine_landmarks,
+)
+from stage_timer import NULL_TIMER, StageTimer
+
+# Sharded extraction ------------------
+# A long video is split into frame ranges and every range runs in its own
+# process with its own mp_pose.Pose. Each shard starts decoding
+# WARMUP_FRAMES early so MediaPipe's tracking state (static_image_mode=False)
+# has settled by the time it reaches the frames it owns; warm-up detections
+# are dropped, so every frame is counted exactly once when the shards are
+# stitched together.
+#
+# The CLIs use this for a single long recording. The app's analysis jobs
+# slice videos the same way but run the slices on their own worker threads
+# (see analysis_jobs).
+
+MIN_SHARD_FRAMES = 600
+
+
+def plan_shards(frame_count, workers, min_shard=MIN_SHARD_FRAMES):
+    """Split ``[0, frame_count)`` into at most ``workers`` contiguous ranges.
+
+    The last range is open-ended (``end=None``) so frames past an
+    underestimated ``CAP_PROP_FRAME_COUNT`` are still decoded.
+    """
+    n = max(1, min(workers, frame_count // max(1, min_shard)))
+    size = math.ceil(frame_count / n) if frame_count else 0
+    bounds = [i * size for i in range(n)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _run_shard(video_path, start, end, warmup, options, timed=False,
+               model_complexity=None):
+    warm_start = max(0, start - warmup)
+    timer = StageTimer() if timed else NULL_TIMER
+    pipeline = FramePipeline(video_path, start=warm_start, end=end, timer=timer,
+                             model_complexity=model_complexity, **options)
+    landmarks, sampled = collect_landmarks(pipeline)
+
+    # Drop the warm-up frames; only [start, end) belongs to this shard.
+    owned = np.asarray(landmarks[start - warm_start:])
+    return owned, sampled[sampled >= start], timer if timed else None
+
+
+def extract_motion_sharded(video_path, workers=None, warmup=WARMUP_FRAMES,
+                           min_shard=MIN_SHARD_FRAMES, timer=NULL_TIMER,
+                           tiered=False, **options):
+    """Process-parallel ``extract_motion`` for long recordings.
+
+    Falls back to the single-process pipeline when the video is too short to
+    be worth splitting. ``options`` are passed to every shard's
+    ``FramePipeline``; worker timings are merged into ``timer``. With
+    ``tiered`` the shards run the lite model and the full-model refinement
+    runs afterwards on the stitched result.
+    """
+    video_path = str(video_path)
+    workers = workers or os.cpu_count() or 1
+    probe = FramePipeline(video_path)
+    shards = plan_shards(probe.frame_count, workers, min_shard)
+    if len(shards) == 1:
+        return extract_motion(video_path, timer=timer, tiered=tiered, **options)
+
+    # spawn keeps worker processes free of the parent's threads and of any
+    # MediaPipe graph the parent may already hold.
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=ctx) as ex:
+        futures = [
+            ex.submit(_run_shard, video_path, start, end, warmup, options,
+                      timer.enabled, LITE_COMPLEXITY if tiered else None)
+            for start, end in shards
+        ]
+        buf = LandmarkBuffer(probe.frame_count)
+        sampled = []
+        for (start, _), future in zip(shards, futures):
+            landmarks, shard_sampled, shard_timer = future.result()
+            buf.write(start, landmarks)
+            sampled.append(shard_sampled)
+            if shard_timer:
+                timer.merge(shard_timer)
+
+    landmarks = buf.finish()
+    sampled = np.concatenate(sampled)
+    if tiered:
+        lite_frames = len(sampled)
+        sampled, full_frames = refine_landmarks(video_path, landmarks, sampled,
+                                                timer, **options)
+    with timer.stage("motion"):
+        motion = motion_result(probe.fps, landmarks, sampled, probe.frame_size)
+    if tiered:
+        motion.update(lite_frames=lite_frames, full_frames=full_frames)
+    return motion
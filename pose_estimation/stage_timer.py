@@ -0,0 +1,107 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Stage timing ------------------
+# Hot-path instrumentation for the frame loop and the analysis after it.
+# Call sites always do
+#
+#   t0 = timer.clock()
+#   ...work...
+#   timer.record("stage", t0)
+#
+# ``NULL_TIMER`` (the default everywhere) turns both calls into no-ops, so
+# instrumentation costs two trivial method calls per stage when disabled.
+
+DIAGNOSTICS_LOG = Path(os.environ.get(
+    "POSE_DIAGNOSTICS_LOG",
+    Path.home() / ".cache" / "pose_estimation" / "diagnostics.jsonl"
+))
+
+
+class StageTimer:
+    """Per-stage timings (one sample per call) plus named event counters.
+
+    Safe to share between the decoder and inference threads: each stage is
+    only ever recorded from one of them.
+    """
+
+    enabled = True
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.samples = {}
+        self.counters = {}
+
+    def record(self, stage, t0):
+        self.samples.setdefault(stage, []).append(time.perf_counter() - t0)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name):
+        t0 = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, t0)
+
+    def merge(self, other):
+        """Add another timer's samples (e.g. from a worker process)."""
+        for stage, samples in other.samples.items():
+            self.samples.setdefault(stage, []).extend(samples)
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    def summary(self):
+        """{"stages": {stage: stats}, "counters": {...}}; times in ms."""
+        stages = {}
+        for stage, samples in self.samples.items():
+            ms = np.asarray(samples) * 1000
+            stages[stage] = {
+                "calls": len(ms),
+                "total_ms": float(ms.sum()),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "max_ms": float(ms.max()),
+            }
+        return {"stages": stages, "counters": dict(self.counters)}
+
+
+class _NullTimer:
+    enabled = False
+
+    @staticmethod
+    def clock():
+        return 0.0
+
+    def record(self, stage, t0):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def merge(self, other):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def write_log(summary, path=DIAGNOSTICS_LOG, **context):
+    """Append one JSON line: timestamp, ``context`` fields and the summary."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), **context, **summary}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, default=str) + "\n")
@@ -0,0 +1,359 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from exercise_profiles import DEFAULT_PROFILE, PROFILES, profile_signal
+from motion_chart import plot_reps
+from pose_pipeline import FramePipeline
+from rep_analysis import RISK_REASONS, score_reps, summarize_reps, window_amplitudes
+
+# Streaming analysis ------------------
+# For recordings too long to hold in memory (all-day sessions). Landmarks
+# are turned into the profile signal WINDOW_FRAMES at a time and dropped;
+# reps are detected on a rolling signal buffer and written out as soon as
+# they are final, i.e. once the peak spacing, scoring window and
+# CONTEXT_SAMPLES of signal after them have arrived. Only that tail of the
+# signal is carried into the next window, so resident memory stays flat
+# however long the video is.
+#
+# Results are appended to ``reps.csv`` and ``signal.csv`` in the output
+# directory, and ``summary.json`` is rewritten after every window, so a
+# stopped run keeps everything up to its last window. The chart is drawn
+# from a per-bucket min/max envelope of fixed size.
+#
+# Reps match the in-memory analysis except where a peak's prominence
+# depends on samples more than CONTEXT_SAMPLES away.
+
+WINDOW_FRAMES = 1800        # one minute at 30 FPS
+CONTEXT_SAMPLES = 300
+MEMORY_LIMIT_MB = float(os.environ.get("POSE_STREAM_MEMORY_MB", 2048))
+CHART_BUCKETS = 2000
+
+
+class MemoryLimitExceeded(MemoryError):
+    pass
+
+
+def rss_mb():
+    """Resident memory of this process in MB (the peak where only that is
+    available), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):  # not Linux
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (2**20 if sys.platform == "darwin" else 1024)
+
+
+class StreamingRepDetector:
+    """``profile_reps`` over a signal that arrives in pieces.
+
+    ``push`` returns the reps (columnar, like ``analyze_reps``; ``peak`` is
+    the global sample index) that can no longer change; ``finish`` returns
+    the rest.
+    """
+
+    def __init__(self, fps, profile, good_t=None, bad_t=None,
+                 context=CONTEXT_SAMPLES, reasons=RISK_REASONS):
+        t = profile["thresholds"]
+        self.fps = fps
+        self.height = t["peak_height"]
+        self.distance = t["peak_distance"]
+        self.prominence = t["peak_prominence"]
+        self.window = t["window"]
+        self.max_amp = t["max_amp"]
+        self.spike_t = t["spike_t"]
+        self.good_t = t["good_t"] if good_t is None else good_t
+        self.bad_t = t["bad_t"] if bad_t is None else bad_t
+        self.reasons = reasons
+        self.margin = max(self.distance, self.window) + context
+
+        self.values = np.zeros(0)
+        self.frames = np.zeros(0, dtype=np.int64)
+        self.offset = 0      # global sample index of values[0]
+        self.boundary = 0    # peaks before this sample are already reported
+        self.count = 0
+        self._prev_good = False
+
+    def push(self, values, frames):
+        self.values = np.concatenate([self.values, np.asarray(values, dtype=np.float64)])
+        self.frames = np.concatenate([self.frames, np.asarray(frames, dtype=np.int64)])
+        return self._scan(final=False)
+
+    def finish(self):
+        return self._scan(final=True)
+
+    def _scan(self, final):
+        end = len(self.values) if final else len(self.values) - self.margin
+        peaks = np.zeros(0, dtype=np.intp)
+        if end > self.boundary - self.offset:
+            peaks, _ = find_peaks(self.values, height=self.height,
+                                  distance=self.distance, prominence=self.prominence)
+            peaks = peaks[(peaks >= self.boundary - self.offset) & (peaks < end)]
+
+        amp = window_amplitudes(self.values, peaks, self.window)
+        scored = score_reps(amp, self.good_t, self.bad_t, self.max_amp,
+                            self.spike_t, self.reasons, prev_good=self._prev_good)
+        frames = self.frames[peaks]
+        reps = {
+            "rep": np.arange(self.count + 1, self.count + len(peaks) + 1),
+            "peak": peaks + self.offset,
+            "frame": frames,
+            "time": np.round(frames / self.fps, 2),
+            "value": self.values[peaks],
+            **scored,
+        }
+        self.count += len(peaks)
+        if len(peaks):
+            self._prev_good = scored["status"][-1] == "GOOD"
+
+        # Keep enough signal before the boundary for the spacing, scoring
+        # window and prominence of the next peaks.
+        self.boundary = max(self.boundary, self.offset + end)
+        cut = max(0, end - self.margin)
+        self.values = self.values[cut:]
+        self.frames = self.frames[cut:]
+        self.offset += cut
+        return reps
+
+
+class SignalEnvelope:
+    """Min and max of the signal per frame bucket, for the chart."""
+
+    def __init__(self, frame_count, buckets=CHART_BUCKETS):
+        self.frame_count = max(1, frame_count)
+        self.buckets = buckets
+        self.lo = np.full(buckets, np.inf)
+        self.hi = np.full(buckets, -np.inf)
+
+    def add(self, frames, values):
+        b = np.minimum(np.asarray(frames) * self.buckets // self.frame_count,
+                       self.buckets - 1)
+        np.minimum.at(self.lo, b, values)
+        np.maximum.at(self.hi, b, values)
+
+    def plot(self, ax, **kwargs):
+        filled = np.isfinite(self.lo)
+        x = (np.arange(self.buckets) + 0.5) * self.frame_count / self.buckets
+        return ax.fill_between(x[filled], self.lo[filled], self.hi[filled], **kwargs)
+
+
+def _interpolate(lo, hi, gap):
+    """Rows for the ``gap`` frames skipped between two detections, as
+    ``fill_skipped`` fills them."""
+    t = (np.arange(1, gap + 1) / (gap + 1))[:, None, None].astype(np.float32)
+    return lo + (hi - lo) * t
+
+
+def _append_csv(table, path):
+    table.to_csv(path, mode="a", header=not path.exists(), index=False)
+
+
+def _write_json(data, path):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def stream_analysis(video_path, out_dir, profile=PROFILES[DEFAULT_PROFILE],
+                    good_t=None, bad_t=None, window_frames=WINDOW_FRAMES,
+                    memory_limit_mb=MEMORY_LIMIT_MB, chart=True, on_reps=None,
+                    **options):
+    """Analyze ``video_path`` in bounded memory; returns the summary.
+
+    ``options`` go to ``FramePipeline`` (``target_fps``, ``inference_size``,
+    ``track_roi``). ``on_reps`` is called with every batch of final reps.
+    Raises ``MemoryLimitExceeded`` once resident memory passes
+    ``memory_limit_mb`` (None disables the check); results written so far
+    stay in ``out_dir``.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    reps_path, signal_path = out_dir / "reps.csv", out_dir / "signal.csv"
+    for path in (reps_path, signal_path):
+        path.unlink(missing_ok=True)
+
+    pipeline = FramePipeline(video_path, **options)
+    fps = pipeline.fps
+    detector = StreamingRepDetector(fps, profile, good_t, bad_t)
+    envelope = SignalEnvelope(pipeline.frame_count)
+    stub = {"frame_size": pipeline.frame_size}
+
+    block = np.empty((window_frames + 1, 33, 4), dtype=np.float32)
+    block_frames = np.empty(window_frames + 1, dtype=np.int64)
+    rows = 0
+    last = None              # (frame, landmarks) of the last detection
+    prev = (None, None)      # (frame, landmarks) of the last inferred frame
+    summary = {
+        "video": str(video_path), "fps": fps,
+        "frame_count": pipeline.frame_count, "frames_done": 0,
+        "status": "running", "peak_rss_mb": 0.0,
+        "total": 0, "good": 0, "bad": 0, "poor": 0, "risky": 0,
+    }
+
+    def write(reps):
+        if len(reps["rep"]):
+            _append_csv(pd.DataFrame(reps).drop(columns=["peak", "color"]), reps_path)
+            for k, v in summarize_reps(reps).items():
+                summary[k] += v
+            if on_reps:
+                on_reps(reps)
+
+    def flush():
+        nonlocal rows, last
+        # The last detection of the previous window leads, so the first
+        # displacement is measured across the window boundary.
+        lead = 0
+        if last is not None:
+            block[rows], block_frames[rows] = last[1], last[0]
+            lead = 1
+        stub["landmarks"] = np.roll(block[:rows + lead], lead, axis=0)
+        frames = np.roll(block_frames[:rows + lead], lead)
+        values, pos = profile_signal(stub, profile)
+        pos = np.asarray(pos, dtype=np.intp)
+        keep = pos >= lead
+        values, frames = np.asarray(values)[keep], frames[pos[keep]]
+        last = (block_frames[rows - 1], block[rows - 1].copy())
+        rows = 0
+
+        envelope.add(frames, values)
+        _append_csv(pd.DataFrame({"frame": frames, "value": values}), signal_path)
+        write(detector.push(values, frames))
+        check()
+
+    def check():
+        summary["frames_done"] = pipeline.start + pipeline.decoded
+        rss = rss_mb()
+        if rss is not None:
+            summary["peak_rss_mb"] = round(max(summary["peak_rss_mb"], rss), 1)
+        if memory_limit_mb and rss is not None and rss > memory_limit_mb:
+            summary["status"] = "memory_limit"
+            _write_json(summary, out_dir / "summary.json")
+            raise MemoryLimitExceeded(
+                f"Resident memory {rss:.0f} MB exceeds the "
+                f"{memory_limit_mb:.0f} MB limit"
+            )
+        _write_json(summary, out_dir / "summary.json")
+
+    def add(frame_no, lms):
+        nonlocal rows
+        block[rows], block_frames[rows] = lms, frame_no
+        rows += 1
+        if rows == window_frames:
+            flush()
+
+    for frame_no, lms in pipeline:
+        prev_frame, prev_lms = prev
+        if lms is not None:
+            # Frames the sampler skipped between two detections.
+            if prev_lms is not None and frame_no - prev_frame > 1:
+                for i, row in enumerate(_interpolate(prev_lms, lms, frame_no - prev_frame - 1)):
+                    add(prev_frame + 1 + i, row)
+            add(frame_no, lms)
+        prev = (frame_no, lms)
+
+    if rows:
+        flush()
+    write(detector.finish())
+    summary["status"] = "done"
+    check()
+
+    if chart:
+        save_chart(out_dir, envelope, profile)
+    return summary
+
+
+def save_chart(out_dir, envelope, profile):
+    """``chart.png`` from the signal envelope and ``reps.csv``."""
+    out_dir = Path(out_dir)
+    fig, ax = plt.subplots(figsize=(14, 4))
+    envelope.plot(ax, color="blue", alpha=0.6, label=profile["signal_label"])
+    if (out_dir / "reps.csv").exists():
+        table = pd.read_csv(out_dir / "reps.csv", usecols=["frame", "value", "status"])
+        plot_reps(ax, {k: table[k].to_numpy() for k in table}, s=20)
+    ax.set_xlabel("Frame")
+    ax.set_ylabel(profile["signal_label"])
+    ax.set_ylim(0, profile["plot_max"])
+    ax.grid(True)
+    ax.legend()
+    fig.savefig(out_dir / "chart.png", dpi=100, bbox_inches="tight")
+    plt.close(fig)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze a long recording in bounded memory."
+    )
+    parser.add_argument("video", help="video file")
+    parser.add_argument("-o", "--out", default="stream_report",
+                        help="output directory for reps.csv, signal.csv, summary.json")
+    parser.add_argument("--exercise", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="exercise profile")
+    parser.add_argument("--good-t", type=float, default=None,
+                        help="good rep threshold; default from the profile")
+    parser.add_argument("--bad-t", type=float, default=None,
+                        help="bad rep threshold; default from the profile")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="adaptive sampling target; default every frame")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="downscale frames to this long side before inference")
+    parser.add_argument("--track-roi", action="store_true",
+                        help="crop to the tracked person")
+    parser.add_argument("--window-frames", type=int, default=WINDOW_FRAMES,
+                        help="frames of landmarks held at a time")
+    parser.add_argument("--memory-limit", type=float, default=MEMORY_LIMIT_MB,
+                        help="stop when resident memory exceeds this many MB (0: no limit)")
+    parser.add_argument("--no-chart", action="store_true",
+                        help="don't draw chart.png")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    def report(reps):
+        for i in range(len(reps["rep"])):
+            risk = f" ⚠️ {reps['reason'][i]}" if reps["injury_risk"][i] else ""
+            print(f"Rep {reps['rep'][i]} | {reps['status'][i]} | "
+                  f"Depth: {reps['depth'][i]}/100 | Time: {reps['time'][i]}s{risk}")
+
+    try:
+        summary = stream_analysis(
+            args.video, args.out, PROFILES[args.exercise],
+            good_t=args.good_t, bad_t=args.bad_t,
+            window_frames=args.window_frames,
+            memory_limit_mb=args.memory_limit or None,
+            chart=not args.no_chart, on_reps=report,
+            target_fps=args.target_fps, inference_size=args.inference_size,
+            track_roi=args.track_roi,
+        )
+    except MemoryLimitExceeded as e:
+        print(f"Stopped: {e}. Results so far are in {args.out}", file=sys.stderr)
+        return 1
+
+    print(f"\nDone: {summary['total']} reps ({summary['good']} good, "
+          f"{summary['risky']} risky), peak memory {summary['peak_rss_mb']:.0f} MB. "
+          f"Reports: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The app modules are flat and imported by name, as when run from
+# pose_estimation/.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
\ No newline at end of file
@@ -0,0 +1,64 @@
+import json
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import landmark_cache
+from analysis_jobs import ACTIVE, JobQueue, job_id, plan_slices
+from landmark_store import FRAME_SHAPE
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30.0, (32, 32))
+    for i in range(650):
+        writer.write(np.full((32, 32, 3), i % 256, dtype=np.uint8))
+    writer.release()
+    frame_count = int(cv2.VideoCapture(str(path)).get(cv2.CAP_PROP_FRAME_COUNT))
+    return path, frame_count
+
+
+def wait(queue, jid, timeout=60):
+    deadline = time.monotonic() + timeout
+    while queue.status(jid)["status"] in ACTIVE:
+        assert time.monotonic() < deadline, queue.status(jid)
+        time.sleep(0.05)
+    return queue.status(jid)
+
+
+def test_resume_with_every_slice_checkpointed(tmp_path, monkeypatch, video):
+    # A server that died while stitching: all checkpoints, no result.
+    monkeypatch.setattr(landmark_cache, "CACHE_DIR", tmp_path / "cache")
+    video_path, frame_count = video
+    digest, options = "d" * 64, {"target_fps": None}
+    jid = job_id(digest, options)
+    job_dir = tmp_path / "jobs" / jid
+    job_dir.mkdir(parents=True)
+
+    rng = np.random.default_rng(0)
+    for start, end in plan_slices(frame_count):
+        frames = (end or frame_count) - start
+        landmarks = rng.random((frames, *FRAME_SHAPE)).astype(np.float32)
+        np.savez(job_dir / f"{start:010d}.npz", landmarks=landmarks,
+                 sampled=np.arange(start, start + frames))
+    now = time.time()
+    with open(job_dir / "job.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "id": jid, "digest": digest, "video_path": str(video_path),
+            "video": "clip.mp4", "options": options, "status": "running",
+            "frame_count": frame_count, "fps": 30.0, "frame_size": [32, 32],
+            "frames_done": frame_count, "current_fps": 0.0, "error": None,
+            "diagnostics": None, "submitted": now, "queued_at": now,
+            "started": now, "updated": now,
+        }, f)
+
+    queue = JobQueue(tmp_path / "jobs", workers=1)
+    job = wait(queue, jid)
+    assert job["status"] == "done", job["error"]
+    assert job["frames_done"] == frame_count
+    motion = landmark_cache.load_motion(digest, options)
+    assert motion is not None and motion["frame_count"] == frame_count
+    assert not list(job_dir.glob("*.npz"))
\ No newline at end of file
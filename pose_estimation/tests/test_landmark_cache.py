@@ -0,0 +1,25 @@
+import numpy as np
+
+import landmark_cache
+from landmark_cache import cache_key, load_motion, save_motion
+
+
+def motion(frames):
+    return {"fps": 30.0, "inference_fps": 30.0, "frame_count": frames,
+            "landmarks": np.zeros((frames, 33, 4), dtype=np.float32),
+            "frame_index": np.arange(frames)}
+
+
+def test_oversized_entry_survives_its_own_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(landmark_cache, "CACHE_DIR", tmp_path)
+    save_motion("old", {}, motion(100), max_bytes=10**6)
+    save_motion("big", {}, motion(10_000), max_bytes=10**6)  # ~5 MB
+
+    assert load_motion("big", {}) is not None
+    assert load_motion("old", {}) is None  # evicted to make room
+
+
+def test_unset_options_share_a_key():
+    assert cache_key("d", {}) == cache_key("d", {"track_roi": False, "tiered": False,
+                                                 "target_fps": None})
+    assert cache_key("d", {}) != cache_key("d", {"tiered": True})
\ No newline at end of file
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from scipy.signal import find_peaks
+
+from live_analysis import OnlinePeakDetector
+
+
+def online_peaks(values, height, distance):
+    detector = OnlinePeakDetector(height, distance)
+    found = []
+    for value in values:
+        found += detector.push(value)
+    found += detector.flush()
+    return [i for i, _ in found]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_find_peaks(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(10, 3000))
+    values = np.sin(np.arange(n) / rng.uniform(3, 30)) + rng.normal(0, rng.uniform(0.05, 1), n)
+    height = rng.uniform(-0.5, 1)
+    distance = int(rng.integers(1, 40))
+
+    expected, _ = find_peaks(values, height=height, distance=distance)
+    assert online_peaks(values, height, distance) == expected.tolist()
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_plateaus(seed):
+    # Quantized values give flat tops; scipy reports their middle sample.
+    # distance=1 keeps clear of the documented equal-height tie order.
+    rng = np.random.default_rng(seed)
+    values = np.round(np.cumsum(rng.normal(0, 1, 1000)) / 3)
+
+    expected, _ = find_peaks(values, height=values.mean(), distance=1)
+    assert online_peaks(values, values.mean(), 1) == expected.tolist()
\ No newline at end of file
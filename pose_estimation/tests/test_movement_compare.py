@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from movement_compare import _band, band_radius, dtw_distance, dtw_path
+
+
+def brute_dtw(a, b, radius=None):
+    # O(n * m) recurrence; cells outside the band stay at infinity.
+    n, m = len(a), len(b)
+    inside = np.ones((n, m), dtype=bool)
+    if radius is not None:
+        lo, hi = _band(n, m, radius)
+        cols = np.arange(m)
+        inside = (cols >= lo[:, None]) & (cols < hi[:, None])
+    D = np.full((n + 1, m + 1), np.inf)
+    D[0, 0] = 0.0
+    for i in range(n):
+        for j in range(m):
+            if inside[i, j]:
+                D[i + 1, j + 1] = abs(a[i] - b[j]) + min(D[i, j], D[i, j + 1], D[i + 1, j])
+    return D[n, m]
+
+
+def series(rng):
+    a = np.cumsum(rng.normal(0, 1, int(rng.integers(1, 60))))
+    b = np.cumsum(rng.normal(0, 1, int(rng.integers(1, 60))))
+    return a, b
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_wide_band_is_full_dtw(seed):
+    a, b = series(np.random.default_rng(seed))
+    radius = max(len(a), len(b))
+    assert dtw_distance(a, b, radius) == pytest.approx(brute_dtw(a, b))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_band_matches_brute_force(seed):
+    a, b = series(np.random.default_rng(seed))
+    radius = band_radius(len(a), len(b))
+    assert dtw_distance(a, b) == pytest.approx(brute_dtw(a, b, radius))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_path_cost(seed):
+    a, b = series(np.random.default_rng(seed))
+    cost, path = dtw_path(a, b)
+    assert cost == pytest.approx(dtw_distance(a, b))
+    assert tuple(path[0]) == (0, 0)
+    assert tuple(path[-1]) == (len(a) - 1, len(b) - 1)
+    assert np.all(np.diff(path, axis=0) >= 0)
+    assert cost == pytest.approx(np.abs(a[path[:, 0]] - b[path[:, 1]]).sum())
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_abandon(seed):
+    a, b = series(np.random.default_rng(seed))
+    cost = dtw_distance(a, b)
+    # A budget at the cost never abandons; a negative one always does.
+    assert dtw_distance(a, b, abandon=cost) == pytest.approx(cost)
+    assert dtw_distance(a, b, abandon=-1.0) == np.inf
\ No newline at end of file
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from rep_analysis import (
+    BAD_T,
+    GOOD_T,
+    MAX_AMP,
+    RISK_REASONS,
+    SPIKE_T,
+    WINDOW,
+    analyze_reps,
+    detect_reps,
+)
+
+
+def reference_reps(values, frame_index, fps, peaks):
+    # The per-peak loop analyze_reps replaced.
+    reps = []
+    for i, peak in enumerate(peaks):
+        segment = values[max(0, peak - WINDOW):min(len(values), peak + WINDOW)]
+        amplitude = float(np.max(segment) - np.min(segment))
+        depth = min(100, int((amplitude / MAX_AMP) * 100))
+        if amplitude >= GOOD_T:
+            status = "GOOD"
+        elif amplitude >= BAD_T:
+            status = "BAD"
+        else:
+            status = "POOR"
+
+        reason = None
+        if status == "POOR":
+            reason = RISK_REASONS["poor"]
+        if amplitude > SPIKE_T:
+            reason = RISK_REASONS["spike"]
+        if i > 0 and status != "GOOD" and reps[-1]["status"] == "GOOD":
+            reason = RISK_REASONS["fatigue"]
+
+        reps.append({
+            "rep": i + 1,
+            "frame": frame_index[peak],
+            "time": round(frame_index[peak] / fps, 2),
+            "amplitude": amplitude,
+            "depth": depth,
+            "status": status,
+            "injury_risk": reason is not None,
+            "reason": reason,
+        })
+    return reps
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_per_peak_loop(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(50, 2000))
+    t = np.arange(n)
+    values = (0.02 * np.abs(np.sin(t / rng.uniform(5, 20)))
+              + rng.normal(0, rng.uniform(0.001, 0.02), n))
+    frame_index = np.cumsum(rng.integers(1, 3, n)).tolist()
+    fps = float(rng.choice([24.0, 29.97, 30.0, 60.0]))
+
+    peaks = detect_reps(values)
+    reps = analyze_reps(values, frame_index, fps)
+    expected = reference_reps(values, frame_index, fps, peaks)
+
+    assert len(reps["rep"]) == len(expected)
+    for j, rep in enumerate(expected):
+        for key, value in rep.items():
+            if key == "amplitude":
+                assert reps[key][j] == pytest.approx(value)
+            else:
+                assert reps[key][j] == value, (j, key)
+
+
+def test_peak_at_signal_edges():
+    values = np.array([0.05, 0.0, 0.0, 0.01, 0.0, 0.0, 0.04])
+    peaks = np.array([0, 3, 6])
+    reps = analyze_reps(values, list(range(len(values))), 30.0, peaks=peaks)
+    expected = reference_reps(values, list(range(len(values))), 30.0, peaks)
+    assert reps["amplitude"].tolist() == pytest.approx([r["amplitude"] for r in expected])
+    assert reps["reason"].tolist() == [r["reason"] for r in expected]
\ No newline at end of file
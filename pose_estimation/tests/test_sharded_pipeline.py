@@ -0,0 +1,15 @@
+import pytest
+
+from sharded_pipeline import plan_shards
+
+
+@pytest.mark.parametrize("frame_count", [0, 599, 600, 1799, 1800, 36_001])
+@pytest.mark.parametrize("workers", [1, 3, 16])
+def test_shards_cover_every_frame_once(frame_count, workers):
+    shards = plan_shards(frame_count, workers, min_shard=600)
+    starts = [start for start, _ in shards]
+    assert starts[0] == 0
+    assert [end for _, end in shards[:-1]] == starts[1:]
+    assert shards[-1][1] is None  # open-ended
+    assert len(shards) <= max(1, min(workers, frame_count // 600))
+    assert all(end - start >= 600 for start, end in shards[:-1])
\ No newline at end of file
@@ -0,0 +1,117 @@
+import itertools
+
+import numpy as np
+import pytest
+from scipy.signal import find_peaks
+
+from rep_analysis import detect_reps, window_amplitudes
+from rep_period import adaptive_reps, period_windows, window_peaks
+from threshold_tuning import (
+    DETECT_CREDIT,
+    MATCH_SECONDS,
+    STATUS_CODES,
+    _label_candidates,
+    _score_grid,
+)
+
+FPS = 30.0
+GRID = {
+    "peak_distance": np.array([8.0, 16.0, 30.0]),
+    "peak_height": np.array([0.005, 0.012, 0.02]),
+    "peak_prominence": np.array([0.0, 0.01]),
+    "window": np.array([6.0, 12.0]),
+    "good_t": np.array([0.015, 0.022, 0.03]),
+    "bad_t": np.array([0.01, 0.015, 0.02]),
+    "max_amp": np.array([0.04, 0.05]),
+}
+
+
+def session(seed):
+    # Steady reps, then a noisy stretch; a few labels miss every rep.
+    rng = np.random.default_rng(seed)
+    t = np.arange(1200) / FPS
+    values = 0.015 + rng.uniform(0.005, 0.015) * np.sin(2 * np.pi * t / rng.uniform(1.0, 3.0))
+    values[600:] = 0.015 + rng.normal(0, 0.008, 600)
+    values += rng.normal(0, 0.002, len(t))
+    frame_index = np.arange(len(t))
+
+    peaks = detect_reps(values)
+    frames = np.concatenate([rng.choice(frame_index[peaks], 6, replace=False),
+                             rng.choice(frame_index, 3, replace=False)])
+    labels = {
+        "frame": frames,
+        "status": rng.choice(["GOOD", "BAD", "POOR", "NONE"], len(frames)),
+        "depth": np.where(rng.random(len(frames)) < 0.5,
+                          rng.integers(0, 101, len(frames)), np.nan),
+    }
+    return values, frame_index, labels
+
+
+def reference_fit(values, frame_index, labels, detect):
+    # One detection and one scoring pass per grid cell.
+    tolerance = int(round(MATCH_SECONDS * FPS))
+    names = ["peak_distance", "peak_height", "peak_prominence", "window",
+             "good_t", "bad_t", "max_amp"]
+    fit = np.empty([len(GRID[k]) for k in names])
+    for at in itertools.product(*(range(len(GRID[k])) for k in names)):
+        d, h, p, w, good_t, bad_t, max_amp = (GRID[k][i] for k, i in zip(names, at))
+        if bad_t >= good_t:
+            fit[at] = -np.inf
+            continue
+        peaks = detect(h, int(d), p or None)
+        amp = window_amplitudes(values, peaks, int(w))
+        peak_frames = frame_index[peaks]
+        score, errors = 0.0, []
+        for frame, status, depth in zip(labels["frame"], labels["status"], labels["depth"]):
+            dist = np.abs(peak_frames - frame)
+            if not (dist <= tolerance).any():
+                continue
+            j = np.argmin(dist)
+            if status == "NONE":
+                score -= 1
+                continue
+            predicted = "GOOD" if amp[j] >= good_t else "BAD" if amp[j] >= bad_t else "POOR"
+            score += 1 if predicted == status else DETECT_CREDIT
+            if not np.isnan(depth):
+                errors.append(abs(min(100, int(amp[j] / max_amp * 100)) - depth))
+        fit[at] = score / len(labels["frame"]) - (np.mean(errors) / 100 if errors else 0)
+    return fit
+
+
+def grid_fit(values, frame_index, labels, windows=None):
+    candidates, _ = find_peaks(values)
+    near = _label_candidates(frame_index[candidates], labels["frame"],
+                             int(round(MATCH_SECONDS * FPS)))
+    status = np.array([STATUS_CODES.get(s, -1) for s in labels["status"]])
+    return _score_grid(values, candidates, near, status, labels["depth"], GRID, windows)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_fixed_spacing(seed):
+    values, frame_index, labels = session(seed)
+    expected = reference_fit(
+        values, frame_index, labels,
+        lambda h, d, p: detect_reps(values, h, d, p))
+    np.testing.assert_allclose(grid_fit(values, frame_index, labels), expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_adaptive_spacing(seed):
+    values, frame_index, labels = session(seed)
+    windows, _ = period_windows(values, FPS)
+    expected = reference_fit(
+        values, frame_index, labels,
+        lambda h, d, p: adaptive_reps(values, FPS, h, d, p)[0])
+    np.testing.assert_allclose(grid_fit(values, frame_index, labels, windows), expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_adaptive_fallback_windows(seed):
+    # Windows without a period use the swept height and distance.
+    values, frame_index, labels = session(seed)
+    windows, _ = period_windows(values, FPS)
+    windows = [w if i % 2 else w[:5] + (None, None) for i, w in enumerate(windows)]
+    expected = reference_fit(
+        values, frame_index, labels,
+        lambda h, d, p: window_peaks(values, windows, h, d, p)[0])
+    np.testing.assert_allclose(grid_fit(values, frame_index, labels, windows), expected)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.signal import find_peaks, peak_prominences
+
+from exercise_profiles import sample_rate
+from rep_analysis import window_amplitudes
+from rep_period import merge_windows, period_windows, search_window
+
+# Threshold auto-tuning ------------------
+# A coach labels a few reps (GOOD/BAD/POOR, optionally a 0-100 depth, or
+# NONE for a detection that isn't a rep) and every combination of the
+# profile thresholds is scored against those labels on the cached signal.
+# MediaPipe is never re-run.
+#
+# The grid is evaluated in one broadcast instead of a loop over
+# combinations. The local maxima of the signal, their heights and
+# prominences are computed once. Distance selection (greedy by height, as
+# in find_peaks) only depends on taller peaks, so for each distance the
+# selection over all maxima is computed once and then restricted by height
+# and prominence. Amplitudes are computed once per window. Only the maxima
+# within MATCH_SECONDS of a label are ever looked at. Grids too large for
+# one broadcast are split along the distance axis across a process pool.
+#
+# With adaptive spacing (see ``rep_period``) the detector the app uses is
+# scored instead. The period windows are measured once; only the peak
+# search within them is repeated per (distance, height, prominence), since
+# height and distance only matter where a window falls back to them.
+#
+# Fit per label: +1 for a rep detected with the labelled status,
+# DETECT_CREDIT for a rep detected with the wrong status, 0 for a missed
+# rep and -1 for a detection at a NONE label. The depth error (when depths
+# are labelled) is subtracted. Ties go to the combination closest to the
+# profile's current thresholds.
+
+MATCH_SECONDS = 0.4
+DETECT_CREDIT = 0.5
+DEPTH_WEIGHT = 1.0          # per 100 points of mean depth error
+PARALLEL_CELLS = 50_000_000  # combinations x labels above which a pool is used
+
+PARAMS = ["peak_height", "peak_distance", "peak_prominence", "window",
+          "good_t", "bad_t", "max_amp"]
+STATUS_CODES = {"POOR": 0, "BAD": 1, "GOOD": 2}
+
+
+def default_grid(profile):
+    """Parameter values to sweep, around ``profile``'s thresholds."""
+    t = profile["thresholds"]
+    scale = np.array([0.5, 0.75, 1.0, 1.25, 1.5])
+    height = t["peak_height"] * np.linspace(0.5, 1.5, 9)
+    prominence = (np.array([0.0, *(t["peak_height"] * scale[:3])])
+                  if t["peak_prominence"] is None
+                  else t["peak_prominence"] * scale)
+    return {
+        "peak_height": height,
+        "peak_distance": np.unique(np.maximum(1, np.round(
+            t["peak_distance"] * np.array([0.5, 0.75, 1.0, 1.25, 1.5, 2.0])))).astype(int),
+        "peak_prominence": prominence,
+        "window": np.unique(np.maximum(2, np.round(t["window"] * scale))).astype(int),
+        "good_t": np.linspace(*profile["good_range"], 11),
+        "bad_t": np.linspace(*profile["bad_range"], 11),
+        "max_amp": t["max_amp"] * np.array([0.6, 0.8, 1.0, 1.2, 1.4]),
+    }
+
+
+def _label_candidates(cand_frames, label_frames, tolerance):
+    """``(L, K)`` candidate indices within ``tolerance`` frames of every
+    label, nearest first; -1 pads."""
+    lo = np.searchsorted(cand_frames, label_frames - tolerance, side="left")
+    hi = np.searchsorted(cand_frames, label_frames + tolerance, side="right")
+    k = max(1, int((hi - lo).max(initial=0)))
+    near = np.full((len(label_frames), k), -1, dtype=np.intp)
+    for i, (a, b) in enumerate(zip(lo, hi)):
+        idx = np.arange(a, b)
+        near[i, :len(idx)] = idx[np.argsort(np.abs(cand_frames[idx] - label_frames[i]),
+                                            kind="stable")]
+    return near
+
+
+def _adaptive_selection(values, candidates, safe, grid, windows):
+    """``(D, H, P, L, K)``: which maxima near each label the adaptive
+    detector keeps, per fallback distance and height and prominence."""
+    nearby = candidates[safe]
+    distances, heights, prominences = (
+        grid[k] for k in ("peak_distance", "peak_height", "peak_prominence"))
+    selected = np.zeros((len(distances), len(heights), len(prominences))
+                        + safe.shape, dtype=bool)
+    for k, p in enumerate(prominences):
+        # Windows with a period don't depend on the fallback thresholds.
+        periodic = [None if w[5] is None else search_window(values, w, None, None, p or None)
+                    for w in windows]
+        for (i, d), (j, h) in itertools.product(enumerate(distances), enumerate(heights)):
+            found = [f if f is not None else search_window(values, w, h, int(d), p or None)
+                     for w, f in zip(windows, periodic)]
+            peaks, _ = merge_windows(values, windows, found, int(d))
+            selected[i, j, k] = np.isin(nearby, peaks)
+    return selected
+
+
+def _score_grid(values, candidates, near, status, depth, grid, windows=None):
+    """Fit of every combination, with axes (peak_distance, peak_height,
+    peak_prominence, window, good_t, bad_t, max_amp). Peaks are detected
+    with adaptive spacing when ``period_windows`` are given."""
+    valid = near >= 0
+    safe = np.where(valid, near, 0)
+
+    # Selected maxima near each label: (D, H, P, L, K)
+    if windows is not None:
+        selected = _adaptive_selection(values, candidates, safe, grid, windows) & valid
+    else:
+        heights = values[candidates]
+        prominence = peak_prominences(values, candidates)[0]
+        keep = np.stack([
+            np.isin(candidates, find_peaks(values, distance=int(d))[0])
+            for d in grid["peak_distance"]
+        ])[:, safe]
+        tall = heights[safe] >= grid["peak_height"][:, None, None]
+        prominent = prominence[safe] >= grid["peak_prominence"][:, None, None]
+        selected = (keep[:, None, None] & tall[None, :, None]
+                    & prominent[None, None, :] & valid)
+
+    detected = selected.any(axis=-1)                            # (D, H, P, L)
+    first = np.take_along_axis(safe[None, None, None],
+                               selected.argmax(axis=-1)[..., None], -1)[..., 0]
+
+    is_rep = status >= 0
+    amp = np.stack([window_amplitudes(values, candidates, int(w))
+                    for w in grid["window"]])                   # (W, C)
+    amp = np.moveaxis(amp[:, first], 0, 3)                      # (D, H, P, W, L)
+    a = amp[:, :, :, :, None, None]                             # (D, H, P, W, 1, 1, L)
+    good_t = grid["good_t"][:, None, None]
+    bad_t = grid["bad_t"][:, None]
+    predicted = np.where(a >= good_t, 2, np.where(a >= bad_t, 1, 0))
+    hit = detected[:, :, :, None, None, None]                   # (D, H, P, 1, 1, 1, L)
+    correct = hit & (predicted == status) & is_rep
+    credit = np.where(correct, 1.0, np.where(hit & is_rep, DETECT_CREDIT, 0.0))
+    credit -= hit & ~is_rep
+    fit = credit.sum(axis=-1) / len(status)                     # (D, H, P, W, G, B)
+    fit[..., ~(grid["bad_t"][None, :] < grid["good_t"][:, None])] = -np.inf
+
+    fit = fit[..., None]                                        # max_amp axis
+    has_depth = ~np.isnan(depth) & is_rep
+    if has_depth.any():
+        pred = np.minimum(100, (amp[..., None, :] / grid["max_amp"][:, None] * 100).astype(int))
+        err = np.where(has_depth & detected[:, :, :, None, None],
+                       np.abs(pred - np.nan_to_num(depth)), 0)
+        n = np.maximum(1, (has_depth & detected).sum(axis=-1))[:, :, :, None, None]
+        fit = fit + (-DEPTH_WEIGHT * err.sum(axis=-1) / n / 100)[:, :, :, :, None, None, :]
+    return fit
+
+
+def tune_thresholds(values, frame_index, fps, labels, profile, grid=None,
+                    adaptive=False, workers=None):
+    """Best-fitting thresholds for ``labels`` on one profile signal.
+
+    ``labels`` is columnar: ``frame`` (video frame of the rep peak),
+    ``status`` (GOOD/BAD/POOR, or NONE for something that is not a rep) and
+    optionally ``depth`` (0-100, NaN if unknown). ``adaptive`` scores the
+    detector ``profile_reps(adaptive=True)`` uses. Returns the suggested
+    ``thresholds`` (profile format), its ``fit`` (1.0 = every label matched)
+    and the number of ``combinations`` evaluated.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    frame_index = np.asarray(frame_index, dtype=np.int64)
+    grid = {k: np.asarray(v, dtype=np.float64) for k, v in
+            (grid or default_grid(profile)).items()}
+    label_frames = np.asarray(labels["frame"], dtype=np.int64)
+    status = np.array([STATUS_CODES.get(s, -1) for s in labels["status"]])
+    depth = np.asarray(labels.get("depth", np.full(len(status), np.nan)),
+                       dtype=np.float64)
+    if not (~np.isnan(depth) & (status >= 0)).any():
+        # max_amp only scales depth; without depth labels it stays as is.
+        grid["max_amp"] = np.array([profile["thresholds"]["max_amp"]], dtype=np.float64)
+
+    candidates, _ = find_peaks(values)
+    if len(candidates) == 0 or len(status) == 0:
+        raise ValueError("Nothing to tune: no labels or no peaks in the signal")
+    near = _label_candidates(frame_index[candidates], label_frames,
+                             int(round(MATCH_SECONDS * fps)))
+    windows = None
+    if adaptive:
+        windows, _ = period_windows(values, sample_rate(frame_index, fps))
+
+    shape = [len(grid[k]) for k in PARAMS]
+    cells = int(np.prod(shape)) * max(1, len(status))
+    workers = workers or os.cpu_count() or 1
+    if cells > PARALLEL_CELLS and workers > 1 and len(grid["peak_distance"]) > 1:
+        # spawn keeps workers free of the parent's threads.
+        parts = np.array_split(grid["peak_distance"], min(workers, len(grid["peak_distance"])))
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(parts), mp_context=ctx) as ex:
+            fits = list(ex.map(_score_grid, *zip(*[
+                (values, candidates, near, status, depth,
+                 {**grid, "peak_distance": part}, windows) for part in parts
+            ])))
+        fit = np.concatenate(fits, axis=0)
+    else:
+        fit = _score_grid(values, candidates, near, status, depth, grid, windows)
+    # _score_grid's axes: (D, H, P, W, G, B, M) -> PARAMS order
+    fit = np.moveaxis(fit, 1, 0)
+
+    # Ties: closest (relative) to the current thresholds.
+    current = profile["thresholds"]
+    closeness = np.zeros(fit.shape)
+    for axis, k in enumerate(PARAMS):
+        ref = current[k] or 0.0
+        step = np.abs(grid[k] - ref) / max(abs(ref), 1e-9)
+        closeness = closeness + step.reshape([-1 if i == axis else 1
+                                              for i in range(len(PARAMS))])
+    best = np.flatnonzero(fit.ravel() == fit.max())
+    flat = best[np.argmin(closeness.ravel()[best])]
+    at = np.unravel_index(flat, fit.shape)
+
+    thresholds = {k: float(grid[k][i]) for k, i in zip(PARAMS, at)}
+    for k in ("peak_distance", "window"):
+        thresholds[k] = int(thresholds[k])
+    if thresholds["peak_prominence"] == 0.0:
+        thresholds["peak_prominence"] = None
+    return {
+        "thresholds": thresholds,
+        "fit": float(fit.max()),
+        "combinations": int(np.prod(shape)),
+        "labels": len(status),
+    }
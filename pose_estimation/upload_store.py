@@ -0,0 +1,173 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import weakref
+from pathlib import Path
+
+# Upload ingestion ------------------
+# Uploads are streamed to disk in fixed-size chunks while being hashed, and
+# stored once per content hash, so a re-upload of the same video reuses the
+# existing file. Each Streamlit session holds references to the files it
+# uploaded; a file is deleted when the last session using it ends or moves
+# on to another upload. Unreferenced files are also evicted (oldest first)
+# whenever the directory grows past its quota.
+
+UPLOAD_DIR = Path(os.environ.get(
+    "POSE_UPLOAD_DIR", Path(tempfile.gettempdir()) / "pose_uploads"
+))
+MAX_UPLOAD_DIR_BYTES = int(os.environ.get(
+    "POSE_UPLOAD_MAX_BYTES", 8 * 1024 * 1024 * 1024
+))
+
+CHUNK_SIZE = 8 * 1024 * 1024
+# .part files older than this are left over from a crashed upload.
+STALE_PART_SECONDS = 3600
+
+_lock = threading.Lock()
+_refs = {}  # path -> number of sessions using it
+
+
+class UploadQuotaError(OSError):
+    """The upload doesn't fit in the quota next to files still in use."""
+
+
+def _dir_entries(upload_dir):
+    entries = []
+    for p in upload_dir.iterdir():
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    return entries
+
+
+def _unlink(path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+def enforce_quota(incoming=0, max_bytes=MAX_UPLOAD_DIR_BYTES,
+                  upload_dir=UPLOAD_DIR):
+    """Evict unreferenced files, oldest first, until ``incoming`` more bytes fit.
+
+    Raises ``UploadQuotaError`` if files still in use leave too little room.
+    """
+    with _lock:
+        entries = _dir_entries(upload_dir)
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, p in sorted(entries):
+            if total + incoming <= max_bytes:
+                break
+            in_progress = p.suffix == ".part" and now - mtime < STALE_PART_SECONDS
+            if _refs.get(p) or in_progress:
+                continue
+            _unlink(p)
+            total -= size
+    if total + incoming > max_bytes:
+        raise UploadQuotaError(
+            f"Upload needs {incoming / 2**20:.0f} MB but only "
+            f"{max(0, max_bytes - total) / 2**20:.0f} MB of the upload quota is free"
+        )
+
+
+def ingest(fileobj, suffix="", size=None, max_bytes=MAX_UPLOAD_DIR_BYTES,
+           upload_dir=UPLOAD_DIR, hold=False):
+    """Stream ``fileobj`` to ``upload_dir/<sha256><suffix>``.
+
+    Returns ``(digest, path)``. Memory use is one chunk regardless of the
+    upload size; if the content is already on disk the new copy is dropped.
+    With ``hold`` the file is referenced (see ``release``) before anything
+    else can evict it.
+    """
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    if size is not None:
+        enforce_quota(size, max_bytes, upload_dir)
+
+    h = hashlib.sha256()
+    fd, part = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    part = Path(part)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            fileobj.seek(0)
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+                f.write(chunk)
+        digest = h.hexdigest()
+        path = upload_dir / f"{digest}{suffix}"
+        with _lock:
+            if path.exists():
+                os.utime(path)
+                _unlink(part)
+            else:
+                os.replace(part, path)
+            if hold:
+                _refs[path] = _refs.get(path, 0) + 1
+    except BaseException:
+        _unlink(part)
+        raise
+    return digest, path
+
+
+def hold(path):
+    """Add a reference to an ingested file (e.g. for a background job).
+
+    Returns False if the file is already gone.
+    """
+    with _lock:
+        if not path.exists():
+            return False
+        _refs[path] = _refs.get(path, 0) + 1
+    return True
+
+
+def release(path):
+    """Drop one reference; the file is deleted with the last one."""
+    with _lock:
+        n = _refs.get(path, 0) - 1
+        if n > 0:
+            _refs[path] = n
+            return
+        _refs.pop(path, None)
+        _unlink(path)
+
+
+def _release_all(files):
+    for _, path in files.values():
+        release(path)
+    files.clear()
+
+
+class SessionUploads:
+    """Uploads ingested by one session; released when the session ends.
+
+    Keep one instance in ``st.session_state``: Streamlit drops the session
+    state when the browser session closes, and the finalizer then releases
+    every file it still holds (also at interpreter exit).
+    """
+
+    def __init__(self, max_bytes=MAX_UPLOAD_DIR_BYTES, upload_dir=UPLOAD_DIR):
+        self.max_bytes = max_bytes
+        self.upload_dir = upload_dir
+        self.files = {}  # file_id -> (digest, path)
+        weakref.finalize(self, _release_all, self.files)
+
+    def get(self, upload):
+        """``(digest, path)`` for a Streamlit ``UploadedFile``, ingesting it once.
+
+        Files from this session's previous uploads are released.
+        """
+        if upload.file_id not in self.files:
+            suffix = Path(upload.name).suffix.lower()
+            digest, path = ingest(upload, suffix, upload.size,
+                                  self.max_bytes, self.upload_dir, hold=True)
+            self.files[upload.file_id] = (digest, path)
+
+        for file_id in [f for f in self.files if f != upload.file_id]:
+            release(self.files.pop(file_id)[1])
+        return self.files[upload.file_id]
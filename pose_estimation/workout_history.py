@@ -0,0 +1,223 @@
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from rep_analysis import summarize_reps
+
+# Workout history ------------------
+# Every analyzed upload is stored as one ``sessions`` row (the summary,
+# counts kept denormalized) plus one ``reps`` row per rep, written in a
+# single transaction. Trend queries aggregate the session rows in SQL
+# through the (user, exercise, recorded_at) index, so they never touch the
+# rep rows or reload CSVs. Re-analysing the same video for the same user
+# and exercise (new thresholds, a rerun) replaces that session instead of
+# adding a duplicate.
+#
+# Thresholds tuned against a coach's labels (see ``threshold_tuning``) are
+# kept per (user, exercise), one row each, replaced on every re-tune.
+
+HISTORY_DB = Path(os.environ.get(
+    "POSE_HISTORY_DB",
+    Path.home() / ".cache" / "pose_estimation" / "history.sqlite"
+))
+
+DEFAULT_USER = "default"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    exercise TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    video TEXT,
+    recorded_at TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    good INTEGER NOT NULL,
+    bad INTEGER NOT NULL,
+    poor INTEGER NOT NULL,
+    risky INTEGER NOT NULL,
+    depth_sum INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS sessions_video
+    ON sessions (user, exercise, digest);
+CREATE INDEX IF NOT EXISTS sessions_trend
+    ON sessions (user, exercise, recorded_at);
+CREATE INDEX IF NOT EXISTS sessions_user_date
+    ON sessions (user, recorded_at);
+
+CREATE TABLE IF NOT EXISTS reps (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    rep INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    time REAL NOT NULL,
+    injury_risk INTEGER NOT NULL,
+    reason TEXT,
+    PRIMARY KEY (session_id, rep)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tuned_thresholds (
+    user TEXT NOT NULL,
+    exercise TEXT NOT NULL,
+    thresholds TEXT NOT NULL,
+    fit REAL NOT NULL,
+    labels INTEGER NOT NULL,
+    tuned_at TEXT NOT NULL,
+    PRIMARY KEY (user, exercise)
+) WITHOUT ROWID;
+"""
+
+
+def connect(path=HISTORY_DB):
+    """Open (creating if needed) the history database."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def save_session(reps, exercise, digest, user=DEFAULT_USER, video=None,
+                 recorded_at=None, path=HISTORY_DB):
+    """Store one analysis (``analyze_reps`` result); returns the session id.
+
+    ``recorded_at`` defaults to now (local time, ISO 8601). A session that
+    already exists for (user, exercise, digest) keeps its id and date; its
+    summary and reps are replaced.
+    """
+    summary = summarize_reps(reps)
+    recorded_at = recorded_at or time.strftime("%Y-%m-%dT%H:%M:%S")
+    rows = zip(
+        reps["rep"].tolist(), reps["status"].tolist(), reps["depth"].tolist(),
+        reps["time"].tolist(), reps["injury_risk"].tolist(), reps["reason"].tolist(),
+    )
+
+    conn = connect(path)
+    try:
+        with conn:  # one transaction
+            session_id = conn.execute(
+                """
+                INSERT INTO sessions (user, exercise, digest, video, recorded_at,
+                                      total, good, bad, poor, risky, depth_sum)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user, exercise, digest) DO UPDATE SET
+                    video = excluded.video, total = excluded.total,
+                    good = excluded.good, bad = excluded.bad,
+                    poor = excluded.poor, risky = excluded.risky,
+                    depth_sum = excluded.depth_sum
+                RETURNING id
+                """,
+                (user, exercise, digest, video, recorded_at, summary["total"],
+                 summary["good"], summary["bad"], summary["poor"],
+                 summary["risky"], int(reps["depth"].sum())),
+            ).fetchone()[0]
+            conn.execute("DELETE FROM reps WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO reps VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((session_id, *row) for row in rows),
+            )
+    finally:
+        conn.close()
+    return session_id
+
+
+def _filters(user, exercise, since):
+    where, params = ["user = ?"], [user]
+    if exercise is not None:
+        where.append("exercise = ?")
+        params.append(exercise)
+    if since is not None:
+        where.append("recorded_at >= ?")
+        params.append(since)
+    return " AND ".join(where), params
+
+
+def weekly_trends(user=DEFAULT_USER, exercise=None, since=None, path=HISTORY_DB):
+    """Per-week (Monday) averages of depth, good-rep ratio and risk flags.
+
+    One row per week with sessions; ``since`` is an ISO date lower bound.
+    """
+    where, params = _filters(user, exercise, since)
+    conn = connect(path)
+    try:
+        return pd.read_sql_query(
+            f"""
+            SELECT date(recorded_at, 'weekday 0', '-6 days') AS week,
+                   COUNT(*) AS sessions,
+                   SUM(total) AS reps,
+                   1.0 * SUM(depth_sum) / NULLIF(SUM(total), 0) AS avg_depth,
+                   1.0 * SUM(good) / NULLIF(SUM(total), 0) AS good_ratio,
+                   1.0 * SUM(risky) / NULLIF(SUM(total), 0) AS risk_ratio
+            FROM sessions
+            WHERE {where}
+            GROUP BY week
+            ORDER BY week
+            """,
+            conn, params=params,
+        )
+    finally:
+        conn.close()
+
+
+def recent_sessions(user=DEFAULT_USER, exercise=None, since=None, limit=20,
+                    path=HISTORY_DB):
+    """The latest ``limit`` sessions, newest first."""
+    where, params = _filters(user, exercise, since)
+    conn = connect(path)
+    try:
+        return pd.read_sql_query(
+            f"""
+            SELECT recorded_at, exercise, video, total, good, bad, poor, risky,
+                   1.0 * depth_sum / NULLIF(total, 0) AS avg_depth
+            FROM sessions
+            WHERE {where}
+            ORDER BY recorded_at DESC
+            LIMIT ?
+            """,
+            conn, params=[*params, limit],
+        )
+    finally:
+        conn.close()
+
+
+def users(path=HISTORY_DB):
+    conn = connect(path)
+    try:
+        return [u for (u,) in conn.execute("SELECT DISTINCT user FROM sessions ORDER BY user")]
+    finally:
+        conn.close()
+
+
+def save_thresholds(thresholds, exercise, user=DEFAULT_USER, fit=None, labels=0,
+                    path=HISTORY_DB):
+    """Store tuned ``thresholds`` (profile format) for (user, exercise),
+    replacing any earlier ones."""
+    conn = connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tuned_thresholds VALUES (?, ?, ?, ?, ?, ?)",
+                (user, exercise, json.dumps(thresholds), fit or 0.0, labels,
+                 time.strftime("%Y-%m-%dT%H:%M:%S")),
+            )
+    finally:
+        conn.close()
+
+
+def load_thresholds(exercise, user=DEFAULT_USER, path=HISTORY_DB):
+    """Tuned thresholds for (user, exercise), or None if never tuned."""
+    conn = connect(path)
+    try:
+        row = conn.execute(
+            "SELECT thresholds FROM tuned_thresholds WHERE user = ? AND exercise = ?",
+            (user, exercise),
+        ).fetchone()
+    finally:
+        conn.close()
+    return None if row is None else json.loads(row[0])